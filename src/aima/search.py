@@ -257,34 +257,77 @@ def breadth_first_graph_search(problem):
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def best_first_graph_search(problem, f, display=False, bound=None, bound_f=None,
+                            max_explored=None, stats=None, trace=None, progress=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    If bound is given, children whose bound_f value (f by default) is above
+    it are discarded before they reach the frontier; as long as bound_f never
+    overestimates, no solution cheaper than bound is lost. bound may also be
+    a function of no arguments, called once per expansion, for a bound that
+    tightens while the search runs (e.g. shared with other searches). Goal
+    children are never pruned: they are leaves, and the search still stops
+    at the first goal it pops, as it would without a bound.
+    If max_explored is given, the explored set keeps at most that many states
+    and evicts the least recently used ones. An evicted state that is reached
+    again is treated as new and may be expanded again: the explored set stays
+    bounded, the search stays complete on problems without infinite paths,
+    but the number of expansions can grow (up to tree search in the worst
+    case). The frontier is not capped and can still grow without limit.
+    If stats is a dict, it is filled with counters about the search.
+    If trace is given, trace.record(node, frontier_size) is called for every
+    expanded node; if progress is given, so is
+    progress.update(node, expanded, frontier_size)."""
     f = memoize(f, 'f')
+    bound_f = bound_f or f
     node = Node(problem.initial)
     frontier = PriorityQueue('min', f)
     frontier.append(node)
-    explored = set()
+    explored = set() if max_explored is None else LRUClosedList(max_explored)
+    expanded = 0
+    pruned = 0
+    peak_frontier = 1
+    if stats is None:
+        stats = {}
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
-            if display:
-                print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
-            return node
+            break
         explored.add(node.state)
+        expanded += 1
+        if trace is not None:
+            trace.record(node, len(frontier))
+        if progress is not None:
+            progress.update(node, expanded, len(frontier))
+        limit = bound() if callable(bound) else bound
         for child in node.expand(problem):
+            if limit is not None and bound_f(child) > limit and not problem.goal_test(child.state):
+                pruned += 1
+                continue
             if child.state not in explored and child not in frontier:
                 frontier.append(child)
             elif child in frontier:
                 if f(child) < frontier[child]:
                     del frontier[child]
                     frontier.append(child)
-    return None
+        peak_frontier = max(peak_frontier, len(frontier))
+    else:
+        node = None
+
+    stats.update(expanded=expanded, pruned=pruned, peak_frontier=peak_frontier)
+    if max_explored is not None:
+        stats.update(evictions=explored.evictions, reexpansions=explored.reexpansions)
+    if display and node is not None:
+        print(expanded, "paths have been expanded and", len(frontier), "paths remain in the frontier")
+        print(pruned, "paths were pruned by the bound, peak frontier size was", peak_frontier)
+        if max_explored is not None:
+            print(explored.evictions, "explored states were evicted,", explored.reexpansions, "were expanded again")
+    return node
 
 
 def uniform_cost_search(problem, display=False):
@@ -412,12 +455,50 @@ greedy_best_first_graph_search = best_first_graph_search
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
 
 
-def astar_search(problem, h=None, display=False):
+def astar_search(problem, h=None, display=False, bound=None, incumbent=None,
+                 max_explored=None, stats=None, trace=None, progress=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
-    else in your Problem subclass."""
+    else in your Problem subclass.
+    An incumbent (a solution Node found by other means) sets the bound to
+    its path cost and is returned if the search finds nothing cheaper.
+    Children are pruned against the bound with problem.lower_bound(node) if
+    the problem defines it, with f otherwise.
+    max_explored, stats, trace and progress are passed on to
+    best_first_graph_search."""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    if bound is None and incumbent is not None:
+        bound = incumbent.path_cost
+    bound_f = getattr(problem, 'lower_bound', None)
+    node = best_first_graph_search(problem, lambda n: n.path_cost + h(n), display, bound, bound_f,
+                                   max_explored, stats, trace, progress)
+    if incumbent is not None and (node is None or incumbent.path_cost < node.path_cost):
+        return incumbent
+    return node
+
+
+def weighted_astar_search(problem, weight=2.0, h=None, display=False, bound=None, max_explored=None):
+    """A* with the heuristic inflated by weight: f(n) = g(n) + weight*h(n).
+    Expands fewer nodes, at the price of solutions up to weight times
+    more expensive when h is admissible."""
+    h = h or problem.h
+    return astar_search(problem, lambda n: weight * h(n), display, bound, max_explored=max_explored)
+
+
+def beam_search(problem, f, width=10):
+    """Breadth-first search that only keeps the width nodes with the lowest
+    f of every depth. Neither complete nor optimal: it returns the cheapest
+    goal node met on the way, or None."""
+    frontier = [Node(problem.initial)]
+    best = None
+    while frontier:
+        children = []
+        for node in frontier:
+            if problem.goal_test(node.state) and (best is None or node.path_cost < best.path_cost):
+                best = node
+            children.extend(node.expand(problem))
+        frontier = heapq.nsmallest(width, children, key=f)
+    return best
 
 
 # ______________________________________________________________________________
@@ -691,6 +772,34 @@ def simulated_annealing_full(problem, schedule=exp_schedule()):
             current = next_choice
 
 
+def annealed_rollouts(problem, schedule=exp_schedule(), on_improvement=None):
+    """Repeated randomized depth-first rollouts from the initial node. At each
+    step a child is drawn with probability proportional to exp(-cost/T), so
+    early rollouts explore and later ones, as the temperature T of the
+    schedule cools down, become greedy. Returns the cheapest goal node found;
+    on_improvement(node) is called every time a cheaper one is found."""
+    best = None
+    t = 0
+    while True:
+        T = schedule(t)
+        t += 1
+        if T == 0:
+            return best
+        node = Node(problem.initial)
+        while not problem.goal_test(node.state):
+            children = node.expand(problem)
+            if not children:
+                node = None
+                break
+            cheapest = min(c.path_cost for c in children)
+            weights = [np.exp((cheapest - c.path_cost) / T) for c in children]
+            node = weighted_sampler(children, weights)()
+        if node is not None and (best is None or node.path_cost < best.path_cost):
+            best = node
+            if on_improvement:
+                on_improvement(best)
+
+
 def and_or_graph_search(problem):
     """[Figure 4.11]Used when the environment is nondeterministic and completely observable.
     Contains OR nodes where the agent is free to choose any action.
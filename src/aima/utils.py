@@ -855,6 +855,46 @@ class PriorityQueue:
         heapq.heapify(self.heap)
 
 
+class LRUClosedList:
+    """A set of explored states that holds at most maxsize of them. When it is
+    full, the least recently used state is evicted. Only the hash of the last
+    maxsize evicted states is remembered, so that expanding one of them again
+    is counted as a re-expansion (hash collisions may overcount, states
+    evicted longer ago are not counted)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.states = collections.OrderedDict()
+        self.evicted = collections.OrderedDict()
+        self.evictions = 0
+        self.reexpansions = 0
+
+    def add(self, state):
+        """Insert state as the most recently used one, evicting the oldest if needed."""
+        if state in self.states:
+            del self.states[state]
+        elif self.evicted.pop(hash(state), False):
+            self.reexpansions += 1
+        self.states[state] = True
+        if len(self.states) > self.maxsize:
+            oldest, _ = self.states.popitem(last=False)
+            self.evicted[hash(oldest)] = True
+            if len(self.evicted) > self.maxsize:
+                self.evicted.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, state):
+        """Return True if state is held; a hit marks it as recently used."""
+        if state in self.states:
+            del self.states[state]
+            self.states[state] = True
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.states)
+
+
 # ______________________________________________________________________________
 # Useful Shorthands
 
@@ -0,0 +1,193 @@
+"""
+Batch planning: solve many choreography problems described in a JSONL file,
+one spec per line, e.g.
+
+    {"id": "song1-90s", "duration": 90, "mandatory": ["Hello", "Sit", "SitRelax"]}
+    {"id": "song2", "solver": "dp", "start": "StandInit", "goal": "Crouch"}
+
+Missing fields take the defaults of dance.py. Problems are solved in a pool
+of worker processes (each loads the catalog once) with a timeout per job,
+and a result line is appended to the output JSONL as soon as a job ends.
+Specs whose fingerprint already has a result in the output are skipped.
+
+    python batch.py specs.jsonl results.jsonl --workers 4 --timeout 300
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import dance
+
+
+BATCH_SOLVERS = ("astar", "dp")     # Pool workers cannot start the portfolio/segments processes
+DEFAULTS = {
+    "solver": "astar",
+    "start": "StandInit",
+    "goal": "Crouch",
+    "mandatory": ["Stand", "StandZero", "Sit", "SitRelax", "Hello", "WipeForehead"],
+    "duration": dance.DanceProblem.MAX_DURATION,
+    "time_step": 0.1,
+    "boredom_bucket": 1,
+}
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def build_problem(spec):
+    """The DanceProblem of a spec (defaults filled in); ValueError on bad specs."""
+    unknown = set(spec) - set(DEFAULTS) - {"id"}
+    if unknown:
+        raise ValueError("unknown fields: {}".format(", ".join(sorted(unknown))))
+    spec = dict(DEFAULTS, **spec)
+    if spec["solver"] not in BATCH_SOLVERS:
+        raise ValueError("solver must be one of {}".format(", ".join(BATCH_SOLVERS)))
+    names = [spec["start"], spec["goal"]] + list(spec["mandatory"])
+    missing = [name for name in names if name not in dance.MOVES]
+    if missing:
+        raise ValueError("unknown moves: {}".format(", ".join(missing)))
+    return dance.DanceProblem(
+        start_move=dance.MOVES[spec["start"]],
+        goal_move=dance.MOVES[spec["goal"]],
+        mandatory_moves=[dance.MOVES[name] for name in spec["mandatory"]],
+        all_moves_list=dance.ALL_MOVES,
+        partitions=dance.PARTITION_MAP,
+        time_step=spec["time_step"],
+        boredom_bucket=spec["boredom_bucket"],
+        max_duration=float(spec["duration"])
+    ), spec["solver"]
+
+
+def fingerprint(spec):
+    problem, solver = build_problem(spec)
+    return "{}-{}".format(solver, problem.fingerprint())
+
+
+def init_worker(catalog_durations):
+    """Runs once per worker process: durations are set up once for all its jobs."""
+    if not catalog_durations:
+        dance.apply_durations()
+    dance.STATS_FILE = None     # Workers would race on the ETA history file
+
+
+def _alarm(signum, frame):
+    raise JobTimeout()
+
+
+def run_quietly(function, timeout=None):
+    """Return function() run with stdout sent to os.devnull (worker output would
+    interleave). Raises JobTimeout after timeout seconds, fractions included;
+    no timeout if it is None or 0. Only for the main thread of a process."""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    signal.signal(signal.SIGALRM, _alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout or 0)
+    try:
+        return function()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def solve(job):
+    """Solve one spec in a worker; returns its result line as a dict."""
+    line, spec, timeout = job
+    result = {"line": line, "id": spec.get("id")}
+    start_t = time.time()
+    try:
+        problem, solver = build_problem(spec)
+        result["fingerprint"] = "{}-{}".format(solver, problem.fingerprint())
+        solution = run_quietly(lambda: dance.SOLVERS[solver](problem), timeout)
+        if solution:
+            moves = problem.plan_moves(solution)
+            result.update(status="ok", plan=[m.name for m in moves], cost=solution.path_cost,
+                          duration=sum(m.execution_time for m in moves))
+        else:
+            result["status"] = "no_plan"
+        result["nodes_explored"] = problem.nodes_explored
+    except JobTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result.update(status="error", error="{}: {}".format(type(e).__name__, e))
+    result["search_time"] = time.time() - start_t
+    return result
+
+
+def done_fingerprints(path):
+    """Fingerprints of the specs that already have a result in path (timeouts
+    and errors are tried again)."""
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for text in f:
+                try:
+                    result = json.loads(text)
+                except ValueError:
+                    continue
+                if result.get("status") in ("ok", "no_plan"):
+                    done.add(result.get("fingerprint"))
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan many choreographies from a JSONL of specs")
+    parser.add_argument("specs", help="JSONL file, one problem spec per line")
+    parser.add_argument("results", help="JSONL file the results are appended to")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="seconds a single problem may take (default: 300)")
+    parser.add_argument("--catalog-durations", action="store_true",
+                        help="plan with the catalog durations (see dance.py)")
+    args = parser.parse_args()
+
+    # The parent fingerprints the specs with the same durations as the workers
+    if not args.catalog_durations:
+        dance.apply_durations()
+    done = done_fingerprints(args.results)
+
+    jobs = []
+    invalid = []
+    skipped = 0
+    with open(args.specs) as f:
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                spec = json.loads(text)
+            except ValueError:
+                spec = None
+            if not isinstance(spec, dict):
+                # Reported as an error result of its own line, like an invalid spec
+                invalid.append({"line": line, "id": None, "status": "error", "search_time": 0.0,
+                                "error": "not a JSON object: {}".format(text.strip()[:80])})
+                continue
+            try:
+                if fingerprint(spec) in done:
+                    skipped += 1
+                    continue
+            except ValueError:
+                pass    # Reported by the worker as an error result
+            jobs.append((line, spec, args.timeout))
+    print "[Batch] {} specs to solve, {} unchanged since the last run".format(len(jobs) + len(invalid), skipped)
+
+    pool = multiprocessing.Pool(args.workers, init_worker, (args.catalog_durations,))
+    try:
+        with open(args.results, "a") as out:
+            results = itertools.chain(invalid, pool.imap_unordered(solve, jobs))
+            for k, result in enumerate(results, 1):
+                out.write(json.dumps(result, sort_keys=True) + "\n")
+                out.flush()
+                print "[Batch] {}/{} line {} ({}): {} in {:.1f}s".format(
+                    k, len(jobs) + len(invalid), result["line"], result["id"], result["status"], result["search_time"]
+                )
+    finally:
+        pool.terminate()
@@ -1,41 +1,79 @@
-from aima.search import Problem, astar_search
-from naoqi import ALProxy
-import pygame
+from aima.search import Problem, Node, astar_search
+from planning.dp import dp_search, dp_budget, MAX_BYTES as DP_MAX_BYTES
+from planning.portfolio import portfolio_solve, replay
+from planning.cache import PlanCache
+from planning.trace import TraceWriter
+from planning.progress import ProgressEstimator
+from planning.macros import Macro, enumerate_macros, mine_macros
+from planning.symmetry import find_mirrors, mirror_group
+from planning.segments import segmented_search, find_hub
+from planning.streaming import stream_plan
+from planning.catalog import load_catalog
+from planning.graph import MoveGraph, members
+from planning.keyframes import derive_durations, module_source, module_digest
+from planning.calibration import calibrate, needs_calibration, save_calibration, load_calibration
+from planning.replan import ShowRunner
+from planning.beats import load_beats
+from planning.playlist import load_playlist, plan_playlist
+import numpy as np
+import importlib
+import copy
+import argparse
+import hashlib
+import heapq
+import math
 import time
 import sys
 import os
 
 
-# --- IMPORTING MOVES ---
-from moves import (
-    stand_init, sit, sit_relax, stand, stand_zero, hello, wipe_forehead, crouch,
-    arms_opening, diagonal_left, diagonal_right, double_movement, move_backward,
-    move_forward, right_arm, rotation_left_foot, rotation_right_foot, union_arms,
-    birthday_dance, arm_dance, blow_kisses, bow, dance_move, the_robot, come_on,
-    staying_alive, rhythm, pulp_fiction, wave, glory, clap, joy
-)
-
 # --- ROBOT CONNECTION SETTINGS ---
 IP, PORT = "127.0.0.1", 9559
 
+# --- PLANNING SETTINGS ---
+PLANNING_DEADLINE = 60.0
+CLOSED_LIMIT = None     # Max explored states kept by A* (None = unbounded)
+TRACE_FILE = None       # Binary expansion trace written by A* (None = no trace)
+STATS_FILE = "search_stats.json"    # Expansions of past A* runs, used for the ETA
+SEGMENT_LENGTH = 30.0   # Seconds per segment for the segmented planner
+STREAM_HORIZON = 20.0   # Seconds planned ahead in streaming mode
+
 # --- SONG CONFIGURATION ---
 SONG_FILENAME = "passin_me_by.mp3"
 
+# --- MOVE CATALOG ---
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "moves", "catalog.json")
+DURATIONS_CACHE = "keyframe_durations.json"     # Durations read from the move modules, by content hash
+CALIBRATION_FILE = "calibration.json"           # Durations measured by --calibrate
+PLAN_CACHE_DIR = "plan_cache"                   # Solved plans by problem fingerprint and solver
+PLAN_CACHE_BYTES = 1 << 20                      # Least recently used plans are deleted above this
+BEAT_CACHE = "beat_grid.json"                   # Beat grids of analysed songs, by audio content hash
+
 
 
 class Move:
     def __init__(self, name, module, execution_time=1.0):
         self.name = name
-        self.module = module
+        self.module = module            # dotted path, imported on first execution
         self.compatibles = set()
         self.execution_time = execution_time
+        self._loaded = None
+
+    def load(self):
+        """Import the move's module (and with it the robot SDK) the first time it is needed."""
+        if self._loaded is None:
+            self._loaded = importlib.import_module(self.module)
+        return self._loaded
 
     def execute(self):
+        """Perform the move on the robot; False if it failed."""
         print "-> Executing: {}".format(self.name)
         try:
-            self.module.main(IP, PORT)
-        except:
-            time.sleep(self.execution_time)
+            self.load().main(IP, PORT)
+        except Exception as e:
+            print "   [Robot] {} failed: {}".format(self.name, e)
+            return False
+        return True
 
     def add_compatibles(self, move_list):
         self.compatibles.update(move_list)
@@ -50,180 +88,498 @@ class Move:
         return self.name == other.name
 
 
+class DanceState(object):
+    """Immutable search state of a DanceProblem. The hash is computed once,
+    so lookups in the explored set and the frontier are cheap."""
+
+    __slots__ = ("move", "pending", "ticks", "step", "last_used", "_key", "_hash")
+
+    def __init__(self, move, pending, ticks, step, last_used, key=None):
+        self.move = move              # index of the current move in all_moves_list
+        self.pending = pending        # bitmask of pending mandatory moves
+        self.ticks = ticks            # time passed since the start of the show, in time steps
+        self.step = step              # number of moves performed after the start move
+        self.last_used = last_used    # step at which every move was last used
+        self._key = key               # if given, states are compared by key (e.g. canonical form)
+        self._hash = hash(key if key is not None else (move, pending, ticks, step, last_used))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, DanceState) or self._hash != other._hash:
+            return False
+        if self._key is not None:
+            return self._key == other._key
+        return (
+            self.move == other.move and
+            self.pending == other.pending and
+            self.ticks == other.ticks and
+            self.step == other.step and
+            self.last_used == other.last_used
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        # Only used to break ties between nodes with the same f in the frontier
+        return (
+            (self.ticks, self.move, self.pending, self.last_used) <
+            (other.ticks, other.move, other.pending, other.last_used)
+        )
+
+    def __repr__(self):
+        return "DanceState(move={}, pending={:b}, ticks={}, step={})".format(
+            self.move, self.pending, self.ticks, self.step
+        )
+
+
 class DanceProblem(Problem):
 
     # --- TUNABLE CONSTANTS ---
     MAX_DURATION = 120.0    # The Robot must finish before this time
     AESTHETIC_WEIGHT = 10.0 # Higher number = Robot prefers "High" category moves more
     CLUMPING_PENALTY = 50.0 # Penalty to prevent doing Mandatories back-to-back
-
-    def __init__(self, start_move, goal_move, mandatory_moves, all_moves_list, partitions):
+    PENDING_PENALTY = 20.0  # Heuristic seconds added per pending Mandatory
+    BEAT_PENALTY = 10.0     # Cost of starting a move half a beat off the beat (with a beat grid)
+    DOWNBEAT_PENALTY = 5.0  # Cost of starting a move half a bar off the downbeat
+
+    def __init__(self, start_move, goal_move, mandatory_moves, all_moves_list, partitions,
+                 intern_states=False, time_step=0.1, boredom_bucket=1, macros=(),
+                 max_duration=None, symmetry=False, beats=None, shared=None):
+        if max_duration is not None:
+            self.MAX_DURATION = max_duration
         self.start_move = start_move
         self.goal_move = goal_move
         self.mandatory_set = frozenset(mandatory_moves)
         self.all_mandatory_moves = set(mandatory_moves)
 
+        # Pending mandatory moves are an integer bitmask, one bit per move
+        self.mandatory_moves = sorted(self.mandatory_set, key=lambda m: m.name)
+        self.mandatory_bit = {m: 1 << i for i, m in enumerate(self.mandatory_moves)}
+        self.full_mask = (1 << len(self.mandatory_moves)) - 1
+
+        # Quantization: time is counted in integer ticks of time_step seconds (durations are
+        # rounded up, so a plan never runs past MAX_DURATION) and last-used steps are rounded
+        # down to multiples of boredom_bucket, so near-identical states merge
+        self.time_step = time_step
+        self.boredom_bucket = boredom_bucket
+        self.max_ticks = int(math.floor(self.MAX_DURATION / time_step + 1e-9))
+
+        # Lookup tables over every mask: time still needed (pending moves + goal),
+        # in seconds and in ticks, and pending count
+        self.pending_time = []
+        self.pending_ticks = []
+        self.pending_count = []
+        goal_bit = self.mandatory_bit.get(goal_move, 0)
+        for mask in range(self.full_mask + 1):
+            needed = [m for m in self.mandatory_moves if mask & self.mandatory_bit[m]]
+            pending = list(needed)
+            if not mask & goal_bit:
+                needed.append(goal_move)
+            self.pending_time.append(sum(m.execution_time for m in needed))
+            self.pending_ticks.append(sum(self.to_ticks(m) for m in needed))
+            self.pending_count.append(len(pending))
+
         self.all_moves_list = sorted(all_moves_list, key=lambda m: m.name)
         self.move_to_index = {m: i for i, m in enumerate(self.all_moves_list)}
         self.partitions = partitions
+
+        # Tables that do not depend on the start move or the song are taken from `shared`
+        # (a dict kept by the caller) when a problem over the same moves built them
+        self.shared = shared
+        self.moves_key = (tuple(
+            (m.name, m.execution_time, partitions.get(m, 0.2),
+             tuple(sorted(c.name for c in m.compatibles)))
+            for m in self.all_moves_list
+        ), time_step)
+
+        # Compatibility graph over move indices, shared by every solver; the hot loops
+        # read plain lists and integer bitsets
+        self.graph = self.shared_table("graph", lambda: MoveGraph(self.all_moves_list, partitions))
+        self.rates = self.graph.rates.tolist()
+        self.ticks = self.graph.ticks(time_step).tolist()
+        self.fits = self.shared_table(("fits", self.max_ticks),
+                                      lambda: self.graph.fitting_bits(self.ticks, self.max_ticks))
+        self.index_bit = [self.mandatory_bit.get(m, 0) for m in self.all_moves_list]
+        self.min_move_ticks = max(1, min(self.ticks))
+        self.max_rate = max(self.rates)
         self.nodes_explored = 0
+        self.avoid_first = 0    # Bits of the moves not offered from the initial state (see resumed)
 
-        # Initial scores set to 0 for every move
-        initial_scores = tuple([0.0] * len(self.all_moves_list))
+        # Cost of starting a move at every tick, precomputed from the beat grid of the song
+        self.beat_grid = beats
+        self.beat_cost = self.beat_costs(time_step, self.max_ticks + 1)
 
-        # Start state = (current move, pending mandatory moves, time passed, boredom scores)
-        initial_state = (
-            start_move,
-            self.mandatory_set,
-            start_move.execution_time,
-            initial_scores
+        self.min_ticks = self.shared_table("min_ticks", self.shortest_times)
+        self.finish_ticks = self.shared_table(
+            ("finish_ticks", goal_move.name, tuple(m.name for m in self.mandatory_moves)), self.finish_times
+        )
+
+        # Macro-actions, grouped by the moves they can follow
+        self.macros = [self.compile_macro(chain) for chain in macros]
+        self.macros_after = [[] for _ in self.all_moves_list]
+        for macro in self.macros:
+            for i in self.graph.predecessors[macro.indices[0]]:
+                self.macros_after[i].append(macro)
+
+        # Mirror images of the catalog; states are compared by their canonical form
+        self.mirrors = self.detect_mirrors() if symmetry else []
+
+        # Optionally share a single object between equal states (not with mirrors: an
+        # interned mirror image would carry the other move into the plan)
+        self.interned = {} if intern_states and not self.mirrors else None
+
+        # Every move counts as last used at step 0, so all boredom scores start at 0
+        initial_last_used = tuple([0] * len(self.all_moves_list))
+
+        initial_state = self.make_state(
+            self.move_to_index[start_move],
+            self.full_mask,
+            self.to_ticks(start_move),
+            0,
+            initial_last_used
         )
 
         super(DanceProblem, self).__init__(initial_state, goal=goal_move)
 
-    def actions(self, state):
-        current_move, pending, elapsed_time, scores = state
+    def move_of(self, state):
+        """Return the Move object the state is currently performing."""
+        return self.all_moves_list[state.move]
+
+    def is_feasible(self):
+        """False if the time limit rules out every plan (checked with finish_ticks)."""
+        state = self.initial
+        return state.ticks + self.finish_ticks[state.move][state.pending] <= self.max_ticks
+
+    def subproblem(self, start_move, goal_move, mandatory_moves, max_duration, offset=0.0):
+        """A DanceProblem with the same moves and settings over a part of the show
+        whose start move starts offset seconds into the show."""
+        return DanceProblem(
+            start_move, goal_move, mandatory_moves, self.all_moves_list, self.partitions,
+            intern_states=self.interned is not None, time_step=self.time_step,
+            boredom_bucket=self.boredom_bucket, macros=self.macros, max_duration=max_duration,
+            symmetry=bool(self.mirrors),
+            beats=self.beat_grid.shifted(offset) if self.beat_grid is not None else None,
+            shared=self.shared
+        )
+
+    def resumed(self, state, avoid=None):
+        """The same problem started from state (e.g. the actual state of the show
+        being danced), sharing the graph and every lookup table. The move avoid
+        (e.g. one that just failed) is not offered as the first move."""
+        problem = copy.copy(self)
+        problem.initial = state
+        problem.avoid_first = 1 << self.move_to_index[avoid] if avoid is not None else 0
+        problem.start_move = self.all_moves_list[state.move]
+        problem.nodes_explored = 0
+        if self.interned is not None:
+            problem.interned = {}
+        return problem
+
+    def fingerprint(self):
+        """Short hash of everything that defines the search: moves with their
+        durations, rates and compatibilities, start, goal, mandatory moves,
+        duration, weights and quantization."""
+        description = repr((
+            [(m.name, m.execution_time, self.rates[i], sorted(c.name for c in m.compatibles))
+             for i, m in enumerate(self.all_moves_list)],
+            self.start_move.name, self.goal_move.name, [m.name for m in self.mandatory_moves],
+            self.MAX_DURATION, self.AESTHETIC_WEIGHT, self.CLUMPING_PENALTY, self.PENDING_PENALTY,
+            self.time_step, self.boredom_bucket, [m.name for m in self.macros], bool(self.mirrors),
+            self.beat_grid.key() if self.beat_grid is not None else None, self.BEAT_PENALTY,
+            self.DOWNBEAT_PENALTY
+        ))
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+
+    def detect_mirrors(self):
+        """Permutations of the move indices (identity excluded) that map the
+        compatibility graph, durations, boredom rates and macros onto
+        themselves and fix the start, goal and mandatory moves."""
+        fixed = [self.start_move, self.goal_move] + self.mandatory_moves
+        macro_chains = set(macro.indices for macro in self.macros)
+        key = lambda m: (self.to_ticks(m), self.partitions.get(m, 0.2))
+        generators = []
+        for mirror in find_mirrors(self.all_moves_list, key, fixed):
+            p = tuple(self.move_to_index[mirror.get(m, m)] for m in self.all_moves_list)
+            if all(tuple(p[i] for i in chain) in macro_chains for chain in macro_chains):
+                generators.append(p)
+        return mirror_group(generators, len(self.all_moves_list))[1:]
+
+    def make_state(self, move, pending, ticks, step, last_used):
+        """A DanceState, keyed by the smallest of its mirror images if there are mirrors."""
+        if not self.mirrors:
+            return DanceState(move, pending, ticks, step, last_used)
+        key = (move, last_used)
+        for p in self.mirrors:
+            mirrored_last_used = [0] * len(last_used)
+            for i, last in enumerate(last_used):
+                mirrored_last_used[p[i]] = last
+            key = min(key, (p[move], tuple(mirrored_last_used)))
+        return DanceState(move, pending, ticks, step, last_used, key=(key, pending, ticks, step))
+
+    def shared_table(self, name, build):
+        """build(), or the table built under name by a problem over the same moves
+        and time step that shares self.shared."""
+        if self.shared is None:
+            return build()
+        key = (name, self.moves_key)
+        if key not in self.shared:
+            self.shared[key] = build()
+        return self.shared[key]
+
+    def beat_costs(self, time_step, count):
+        """Cost of starting a move at each of count ticks of time_step seconds
+        (all 0 without a beat grid)."""
+        if self.beat_grid is None:
+            return [0.0] * count
+        return self.beat_grid.costs(time_step, count, self.BEAT_PENALTY, self.DOWNBEAT_PENALTY)
+
+    def compile_macro(self, chain):
+        """Precompute duration, cleared mandatory bits and the state-independent
+        cost of a chain of compatible moves."""
+        chain = getattr(chain, "moves", chain)
+        for a, b in zip(chain, chain[1:]):
+            if b not in a.compatibles or a == b:
+                raise ValueError("{} cannot follow {}".format(b, a))
+        static_cost = sum(m.execution_time for m in chain)
+        for a, b in zip(chain, chain[1:]):
+            static_cost += self.clumping(a, b)
+        mask = 0
+        for m in chain:
+            mask |= self.mandatory_bit.get(m, 0)
+        indices = [self.move_to_index[m] for m in chain]
+        return Macro(chain, indices, sum(self.ticks[i] for i in indices), mask, static_cost)
+
+    def clumping(self, current_move, next_move):
+        """Penalty for performing two mandatory moves back-to-back."""
+        if (current_move in self.all_mandatory_moves) and (next_move in self.all_mandatory_moves):
+            if current_move.name != "StandInit":
+                return self.CLUMPING_PENALTY
+        return 0.0
+
+    def plan_moves(self, node):
+        """All the moves of the plan ending in node, macros expanded, start move included."""
+        moves = [self.start_move]
+        for action in node.solution():
+            moves.extend(getattr(action, "moves", (action,)))
+        return moves
+
+    def to_ticks(self, move):
+        """Duration of a move in time steps, rounded up."""
+        return int(math.ceil(move.execution_time / self.time_step - 1e-9))
+
+    def seconds(self, state):
+        """Time passed in the state, in seconds."""
+        return state.ticks * self.time_step
+
+    def shortest_times(self):
+        """All-pairs minimum time (Floyd-Warshall over the compatibility graph):
+        min_ticks[i][j] is the least time, in ticks, needed after move i ends
+        until move j ends."""
+        n = len(self.all_moves_list)
+        dist = np.where(self.graph.adjacency, np.array(self.ticks, dtype=float), np.inf)
+        np.fill_diagonal(dist, 0)
+        for k in range(n):
+            dist = np.minimum(dist, dist[:, k, None] + dist[None, k, :])
+        return dist.tolist()
+
+    def finish_times(self):
+        """Lower bound, in ticks, on the time needed after a move ends to perform
+        every pending mandatory move and end on the goal move, for every
+        (move, pending mask) pair."""
+        goal = self.move_to_index[self.goal_move]
+        to_goal = [row[goal] for row in self.min_ticks]
+        table = []
+        for i in range(len(self.all_moves_list)):
+            row = []
+            for mask in range(self.full_mask + 1):
+                if mask == 0:
+                    row.append(to_goal[i])
+                    continue
+                detour = max(
+                    self.min_ticks[i][self.move_to_index[m]] + to_goal[self.move_to_index[m]]
+                    for m in self.mandatory_moves if mask & self.mandatory_bit[m]
+                )
+                row.append(max(detour, self.pending_ticks[mask]))
+            table.append(row)
+        return table
+
+    def quantization_report(self):
+        """Worst-case price of the quantization settings: seconds of song time that
+        tick rounding can leave unused, and how far the boredom bucketing can move
+        the cost of a plan away from its exact cost."""
+        max_steps = self.max_ticks // self.min_move_ticks
+        max_rounding = max(t * self.time_step - m.execution_time
+                           for t, m in zip(self.ticks, self.all_moves_list))
+        return {
+            "time_step": self.time_step,
+            "boredom_bucket": self.boredom_bucket,
+            "max_unused_time": max(0.0, max_steps * max_rounding),
+            "max_cost_error": max_steps * (self.boredom_bucket - 1) * self.max_rate * self.AESTHETIC_WEIGHT,
+        }
 
+    def actions(self, state):
         self.nodes_explored += 1
-        if self.nodes_explored % 1000 == 0:
-            print "   [Thinking] Analyzed {} partial plans...".format(self.nodes_explored)
 
-        candidates = list(current_move.compatibles)
+        # Successors (never the current move) that fit in the time left, in one bitwise and
+        budget = self.max_ticks - state.ticks
+        candidates = self.graph.successor_bits[state.move] & self.fits[budget] if budget >= 0 else 0
+        avoid = self.avoid_first if state is self.initial else 0
+        candidates &= ~avoid
         valid_moves = []
 
-        for m in candidates:
-            predicted_time = elapsed_time + m.execution_time
-            # Reject moves that exceed max total time
-            if predicted_time > self.MAX_DURATION:
-                continue
-            # Reject repeating the same move twice
-            if m.name == current_move.name:
+        for i in members(candidates):
+            # Reject moves after which the pending mandatories and the goal cannot fit in time
+            pending = state.pending & ~self.index_bit[i]
+            if state.ticks + self.ticks[i] + self.finish_ticks[i][pending] > self.max_ticks:
                 continue
 
-            valid_moves.append(m)
+            valid_moves.append(self.all_moves_list[i])
+
+        for macro in self.macros_after[state.move]:
+            predicted_ticks = state.ticks + macro.ticks
+            if predicted_ticks > self.max_ticks or avoid >> macro.indices[0] & 1:
+                continue
+            pending = state.pending & ~macro.mask
+            if predicted_ticks + self.finish_ticks[macro.indices[-1]][pending] > self.max_ticks:
+                continue
+            valid_moves.append(macro)
 
         return valid_moves
 
     def result(self, state, action):
-        current_move, pending, elapsed, current_scores = state
+        if isinstance(action, Macro):
+            new_ticks = state.ticks + action.ticks
+            new_pending = state.pending & ~action.mask
+            new_step = state.step
+            last_used = list(state.last_used)
+            for i in action.indices:
+                new_step += 1
+                last_used[i] = new_step - new_step % self.boredom_bucket
+            new_state = self.make_state(i, new_pending, new_ticks, new_step, tuple(last_used))
+            if self.interned is not None:
+                new_state = self.interned.setdefault(new_state, new_state)
+            return new_state
+
         next_move = action
 
-        new_time = elapsed + next_move.execution_time
+        i = self.move_to_index[next_move]
+        new_ticks = state.ticks + self.ticks[i]
 
         # Update pending mandatory tasks
-        if next_move in pending:
-            new_pending = frozenset(x for x in pending if x != next_move)
-        else:
-            new_pending = pending
-
-        new_scores_list = list(current_scores)
+        new_pending = state.pending & ~self.mandatory_bit.get(next_move, 0)
 
-        for i, move_obj in enumerate(self.all_moves_list):
-            if move_obj == next_move:
-                new_scores_list[i] = 0.0
-            else:
-                rate = self.partitions.get(move_obj, 0.2)
-                new_scores_list[i] += rate
+        # Only the chosen move's last-used step changes
+        new_step = state.step + 1
+        bucketed_step = new_step - new_step % self.boredom_bucket
+        last_used = state.last_used
+        new_last_used = last_used[:i] + (bucketed_step,) + last_used[i + 1:]
 
-        new_scores = tuple(new_scores_list)
-
-        return (next_move, new_pending, new_time, new_scores)
+        new_state = self.make_state(i, new_pending, new_ticks, new_step, new_last_used)
+        if self.interned is not None:
+            new_state = self.interned.setdefault(new_state, new_state)
+        return new_state
 
     def path_cost(self, c, state1, action, state2):
-        current_move = state1[0]
-        current_scores = state1[3]
+        current_move = self.all_moves_list[state1.move]
+
+        if isinstance(action, Macro):
+            # Same cost as performing the chain one move at a time
+            step_cost = action.static_cost + self.clumping(current_move, action.moves[0])
+            step = state1.step
+            ticks = state1.ticks
+            last_used = {}
+            for i in action.indices:
+                last = last_used.get(i, state1.last_used[i])
+                step_cost -= self.rates[i] * (step - last) * self.AESTHETIC_WEIGHT
+                step_cost += self.beat_cost[ticks]
+                step += 1
+                ticks += self.ticks[i]
+                last_used[i] = step - step % self.boredom_bucket
+            return c + step_cost
+
         next_move = action
 
         step_cost = next_move.execution_time
 
+        # Boredom score: the move's rate for every step since it was last used
         move_index = self.move_to_index[next_move]
-        aesthetic_value = current_scores[move_index]
+        aesthetic_value = self.rates[move_index] * (state1.step - state1.last_used[move_index])
 
         step_cost -= (aesthetic_value * self.AESTHETIC_WEIGHT)
+        step_cost += self.clumping(current_move, next_move)
 
-        if (current_move in self.all_mandatory_moves) and (next_move in self.all_mandatory_moves):
-            if current_move.name != "StandInit":
-                step_cost += self.CLUMPING_PENALTY
+        # The move starts when the current one ends
+        step_cost += self.beat_cost[state1.ticks]
 
         return c + step_cost
 
     def h(self, n):
-        move, pending, elapsed_time, scores = n.state
-        time_needed = sum(m.execution_time for m in pending)
-
-        if self.goal_move not in pending:
-            time_needed += self.goal_move.execution_time
-
-        if elapsed_time + time_needed > self.MAX_DURATION:
+        state = n.state
+        if state.ticks + self.pending_ticks[state.pending] > self.max_ticks:
             return float('inf')
 
-        return time_needed + (len(pending) * 20.0)
+        return self.pending_time[state.pending] + (
+            self.pending_count[state.pending] * self.PENDING_PENALTY
+        )
 
     def goal_test(self, state):
-        move, pending, elapsed_time, scores = state
-
         return (
-            move == self.goal_move and
-            len(pending) == 0 and
-            elapsed_time <= self.MAX_DURATION
+            self.all_moves_list[state.move] == self.goal_move and
+            state.pending == 0 and
+            state.ticks <= self.max_ticks
         )
 
+    def lower_bound(self, n):
+        """Cost of the cheapest plan through node n can never be lower than this.
+        Every remaining step costs at least its duration minus its boredom bonus.
+        A move used u more times before step N collects at most rate * (N - 1 - last_used)
+        in total, and at most one move per remaining step can collect anything.
+        A goal node has nothing left to dance: its bound is its cost."""
+        state = n.state
+        if self.goal_test(state):
+            return n.path_cost
+        remaining_steps = (self.max_ticks - state.ticks) // self.min_move_ticks
+        last_step = state.step + remaining_steps
+        bonuses = heapq.nlargest(remaining_steps, (
+            rate * (last_step - 1 - last) for rate, last in zip(self.rates, state.last_used)
+        ))
+        bonus = sum(b for b in bonuses if b > 0)
+        bonus += remaining_steps * (self.boredom_bucket - 1) * self.max_rate
+        return n.path_cost + self.pending_time[state.pending] - bonus * self.AESTHETIC_WEIGHT
+
+    def greedy_plan(self, max_expansions=10000):
+        """Depth-first pre-pass that always tries the cheapest next move first.
+        Returns the first goal Node found (an incumbent for astar_search) or None."""
+        stack = [[Node(self.initial)]]
+        expansions = 0
+        while stack and expansions < max_expansions:
+            if not stack[-1]:
+                stack.pop()
+                continue
+            node = stack[-1].pop()
+            if self.goal_test(node.state):
+                return node
+            expansions += 1
+            children = node.expand(self)
+            children.sort(key=lambda c: c.path_cost, reverse=True)
+            stack.append(children)
+        return None
+
 
 
 # --- MOVES SET-UP ---
-StandInit = Move("StandInit", stand_init, 1.50)
-Sit = Move("Sit", sit, 9.50)
-SitRelax = Move("SitRelax", sit_relax, 10.90)
-Stand = Move("Stand", stand, 1.60)
-StandZero = Move("StandZero", stand_zero, 2.00)
-Crouch = Move("Crouch", crouch, 3.00)
-
-Hello = Move("Hello", hello, 4.60)
-WipeForehead = Move("WipeForehead", wipe_forehead, 4.50)
-BlowKisses = Move("BlowKisses", blow_kisses, 5.20)
-Bow = Move("Bow", bow, 4.30)
-ComeOn = Move("ComeOn", come_on, 4.00)
-Wave = Move("Wave", wave, 3.70)
-Glory = Move("Glory", glory, 4.00)
-Clap = Move("Clap", clap, 4.30)
-Joy = Move("Joy", joy, 5.00)
-
-ArmsOpening = Move("ArmsOpening", arms_opening, 4.30)
-DiagonalLeft = Move("DiagonalLeft", diagonal_left, 3.50)
-DiagonalRight = Move("DiagonalRight", diagonal_right, 3.50)
-DoubleMovement = Move("DoubleMovement", double_movement, 3.70)
-MoveBackward = Move("MoveBackward", move_backward, 4.00)
-MoveForward = Move("MoveForward", move_forward, 4.00)
-RightArm = Move("RightArm", right_arm, 9.00)
-UnionArms = Move("UnionArms", union_arms, 9.00)
-RotationLeftFoot = Move("RotationLeftFoot", rotation_left_foot, 6.00)
-RotationRightFoot = Move("RotationRightFoot", rotation_right_foot, 6.00)
-
-BirthdayDance = Move("BirthdayDance", birthday_dance, 6.00)
-ArmDance = Move("ArmDance", arm_dance, 10.20)
-DanceMove = Move("DanceMove", dance_move, 6.50)
-TheRobot = Move("TheRobot", the_robot, 5.90)
-StayingAlive = Move("StayingAlive", staying_alive, 5.90)
-Rhythm = Move("Rhythm", rhythm, 3.20)
-PulpFiction = Move("PulpFiction", pulp_fiction, 5.90)
-
-
-SET_HIGH = [
-    ArmDance, TheRobot, StayingAlive, PulpFiction,
-    BirthdayDance, DanceMove, DoubleMovement, Rhythm
-]
-
-SET_MID = [
-    Hello, Wave, ComeOn, BlowKisses, ArmsOpening,
-    DiagonalLeft, DiagonalRight, MoveForward, MoveBackward,
-    RightArm, UnionArms, Joy, Glory, Clap,
-    RotationLeftFoot, RotationRightFoot
-]
-
-SET_LOW = [
-    StandInit, Stand, StandZero, Sit, SitRelax,
-    Crouch, WipeForehead, Bow
-]
+# Names, durations, categories and compatibilities are read from CATALOG_FILE
+CATALOG, CATEGORY = load_catalog(CATALOG_FILE, Move)
+MOVES = {m.name: m for m in CATALOG}
+
+SET_HIGH = [m for m in CATALOG if CATEGORY[m] == "HIGH"]
+SET_MID = [m for m in CATALOG if CATEGORY[m] == "MID"]
+SET_LOW = [m for m in CATALOG if CATEGORY[m] == "LOW"]
 
 PARTITION_MAP = {}
 ALL_MOVES = []
@@ -241,81 +597,287 @@ for m in SET_LOW:
 ALL_MOVES = SET_HIGH + SET_MID + SET_LOW
 
 
-StandInit.add_compatibles([Stand, Sit])
-Sit.add_compatibles([SitRelax, Stand, StandZero])
-SitRelax.add_compatibles([Sit, Stand, StandZero])
-
-hub_destinations = [
-    StandZero, Sit, Crouch, Hello, WipeForehead,
-    ArmsOpening, UnionArms, RightArm, MoveForward,
-    MoveBackward, RotationLeftFoot, RotationRightFoot,
-    DiagonalLeft, DiagonalRight, BirthdayDance,
-    Wave, Clap, Glory, Joy, Bow, BlowKisses,
-    ComeOn, Rhythm, TheRobot, StayingAlive,
-    PulpFiction, ArmDance, DanceMove
-]
-
-Stand.add_compatibles(hub_destinations)
-StandZero.add_compatibles(hub_destinations)
-Crouch.add_compatibles([Stand, StandZero])
-
-safe_gestures = [
-    Stand, StandZero, WipeForehead, RightArm, UnionArms,
-    ArmsOpening, Hello, Wave, Clap, Glory,
-    Joy, Bow, BlowKisses, ComeOn, Rhythm
-]
-
-for m in safe_gestures:
-    if m not in (Stand, StandZero):
-        m.add_compatibles(safe_gestures)
-        m.add_compatibles([
-            DiagonalLeft, DiagonalRight,
-            MoveForward, MoveBackward
-        ])
-
-ComeOn.add_compatibles([MoveForward, ArmsOpening])
-Bow.add_compatibles([Stand, StandZero, Wave])
-
-DiagonalLeft.add_compatibles([Stand, StandZero, RightArm, RotationLeftFoot])
-DiagonalRight.add_compatibles([Stand, StandZero, RightArm, RotationRightFoot])
-RotationLeftFoot.add_compatibles([Stand, StandZero, DiagonalLeft])
-RotationRightFoot.add_compatibles([Stand, StandZero, DiagonalRight])
-MoveForward.add_compatibles([Stand, StandZero, MoveBackward, ComeOn])
-MoveBackward.add_compatibles([Stand, StandZero, MoveForward, Wave])
-
-complex_moves = [
-    BirthdayDance, DoubleMovement, TheRobot,
-    StayingAlive, PulpFiction, ArmDance, DanceMove
-]
-
-for m in complex_moves:
-    m.add_compatibles([Stand, StandZero])
-
-DoubleMovement.add_compatibles([ArmsOpening, Joy])
-
-
-# Choreography execution function
-def execute_choreography(moves):
+# Choreography execution functions
+def wake_robot():
+    """Connect to the robot and wake it up; returns its ALMotion proxy."""
+    from naoqi import ALProxy
+    motion = ALProxy("ALMotion", IP, PORT)
+    motion.wakeUp()
+    return motion
+
+
+def dance_moves(moves, problem=None):
+    """Perform the moves on the awake robot. Given the problem they were planned
+    for, the rest of the show is planned again whenever a move fails or the
+    show runs late."""
+    show = ShowRunner(problem, moves) if problem is not None else None
+    for m in (show if show is not None else moves):
+        ok = m.execute()
+        if show is not None:
+            show.report(m, ok)
+        elif not ok:
+            time.sleep(m.execution_time)    # Stay in time with the music
+
+
+def execute_choreography(moves, problem=None, on_ready=None):
+    """Wake the robot, call on_ready (e.g. start_music, so the song starts in
+    time with the first move rather than during wakeUp), dance the moves and
+    rest."""
     try:
-        motion = ALProxy("ALMotion", IP, PORT)
-        motion.wakeUp()
+        motion = wake_robot()
+        if on_ready is not None:
+            on_ready()
+        dance_moves(moves, problem)
+        motion.rest()
+    except Exception as e:
+        print "Error: {}".format(e)
+
 
+def start_music(filename=SONG_FILENAME):
+    import pygame
+    if os.path.exists(filename):
+        print "\n[Music] Loading: {}".format(filename)
+        pygame.mixer.init()
+        pygame.mixer.music.load(filename)
+        print "[Music] Playing..."
+        pygame.mixer.music.play()
+    else:
+        print "\n[Music] WARNING: File '{}' not found. Dancing without music.".format(
+            filename
+        )
+
+
+def stop_music():
+    # Planner-only runs never load pygame nor start the mixer
+    try:
+        import pygame
+    except ImportError:
+        return
+    if not pygame.mixer.get_init():
+        return
+    pygame.mixer.music.stop()
+    print "[Music] Stopped."
+
+
+def stream_choreography(problem):
+    """Moves of the show, planned one horizon at a time while the previous one
+    is danced. The music starts as soon as the first window is planned."""
+    start_t = time.time()
+    for k, moves in enumerate(stream_plan(problem, horizon=STREAM_HORIZON)):
+        if k == 0:
+            print "[Stream] First window planned in {:.2f}s".format(time.time() - start_t)
+            start_music()
+        print "[Stream] Window {} committed: {}".format(k + 1, ", ".join(m.name for m in moves))
         for m in moves:
-            m.execute()
-        motion.rest()
+            yield m
+
+
+
+def song_beats(filename):
+    """Beat grid of a song for --beats, or None (with a warning) if it cannot be analysed."""
+    try:
+        grid = load_beats(filename, BEAT_CACHE)
+    except (IOError, OSError, ValueError) as e:
+        print "[Beats] WARNING: cannot analyse '{}' ({}). Planning without beats.".format(filename, e)
+        return None
+    print "[Beats] {:.1f} BPM, {} beats, {} downbeats in {}".format(
+        grid.tempo, len(grid.beats), len(grid.downbeats), filename
+    )
+    return grid
+
+
+def cached_macros(cache, known=()):
+    """Chains of moves that recur in the plans of the cache, minus the known
+    ones and those the current catalog no longer allows."""
+    plans = [[MOVES[name] for name in plan] for plan in cache.plans()
+             if all(name in MOVES for name in plan)]
+    return [chain for chain in mine_macros(plans) if chain not in known and
+            all(b in a.compatibles and a != b for a, b in zip(chain, chain[1:]))]
+
+
+def perform_playlist(songs, problems, solve, cache=None, prefix=""):
+    """Dance the songs one after the other, each as soon as its plan is ready
+    (all of them are planned in parallel). The robot wakes up once, when the
+    first song is ready, and rests after the last one."""
+    start_t = time.time()
+    motion = None
+    try:
+        for k, solution in plan_playlist(problems, solve, cache, prefix):
+            song, problem = songs[k], problems[k]
+            if solution is None:
+                print "\n[Playlist] FAILURE: no plan for song {} ({}). Stopping the show.".format(
+                    k + 1, song["file"]
+                )
+                break
+            choreography = problem.plan_moves(solution)
+            print "\n[Playlist] Song {}/{} ({}) ready after {:.2f}s: {} moves, {:.2f}s".format(
+                k + 1, len(songs), song["file"], time.time() - start_t, len(choreography),
+                sum(m.execution_time for m in choreography)
+            )
+            print "   " + ", ".join(m.name for m in choreography)
+            if motion is None:
+                motion = wake_robot()
+            start_music(song["file"])
+            try:
+                dance_moves(choreography, problem)
+            finally:
+                stop_music()
+        if motion is not None:
+            motion.rest()
     except Exception as e:
         print "Error: {}".format(e)
 
 
+def apply_durations(quantile="p95", display=False):
+    """Replace the catalog durations with the ones read from the keyframe
+    timelines, then with the ones measured by --calibrate."""
+    changed = derive_durations(CATALOG, os.path.dirname(CATALOG_FILE), DURATIONS_CACHE)
+    if display:
+        for m in sorted(changed, key=lambda m: m.name):
+            print "[Config] {} lasts {:.2f}s by its keyframes (catalog: {:.2f}s)".format(
+                m.name, changed[m][1], changed[m][0]
+            )
+    # Measured durations take precedence over the ones read from the sources, as long
+    # as the module has not changed since it was measured
+    folder = os.path.dirname(CATALOG_FILE)
+    measured = load_calibration(CALIBRATION_FILE, quantile,
+                                {m.name: module_digest(m, folder) for m in CATALOG})
+    for m in CATALOG:
+        if m.name in measured:
+            m.execution_time = measured[m.name]
+    if measured and display:
+        print "[Config] {} durations measured ({}) in {}".format(len(measured), quantile, CALIBRATION_FILE)
+
+
+def seeded_astar_search(problem):
+    """A* bounded from the first expansion by a greedy incumbent plan."""
+    stats = {}
+    trace = TraceWriter(TRACE_FILE, move_id=lambda n: n.state.move) if TRACE_FILE else None
+    incumbent = problem.greedy_plan()
+    progress = ProgressEstimator(bound=incumbent.path_cost if incumbent else None,
+                                 stats_file=STATS_FILE, key=problem.fingerprint())
+    try:
+        solution = astar_search(problem, incumbent=incumbent, max_explored=CLOSED_LIMIT,
+                                stats=stats, trace=trace, progress=progress)
+        progress.finish()
+    finally:
+        if trace is not None:
+            trace.close()
+            print "[Trace] {} expansions written to {}".format(trace.next_id, TRACE_FILE)
+    if incumbent is not None:
+        print "[Bound] Greedy plan of cost {:.1f}: {} plans pruned, peak frontier of {} plans".format(
+            incumbent.path_cost, stats["pruned"], stats["peak_frontier"]
+        )
+    if CLOSED_LIMIT is not None:
+        print "[Memory] {} explored states evicted, {} plans analyzed again".format(
+            stats["evictions"], stats["reexpansions"]
+        )
+    return solution
+
+
+def portfolio_search(problem):
+    """Race the portfolio solvers and keep the cheapest plan."""
+    solution, winner = portfolio_solve(problem, deadline=PLANNING_DEADLINE, display=True,
+                                       max_explored=CLOSED_LIMIT)
+    if solution:
+        print "[Portfolio] Best plan found by: {}".format(winner)
+    return solution
+
+
+def segments_search(problem):
+    """Plan fixed-length segments of the show in parallel and stitch them."""
+    return segmented_search(problem, segment_length=SEGMENT_LENGTH, deadline=PLANNING_DEADLINE)
+
+
+# Available planners, selected with --solver
+SOLVERS = {
+    "portfolio": portfolio_search,
+    "astar": seeded_astar_search,
+    "dp": dp_search,
+    "segments": segments_search,
+}
+
+
+def positive(cast):
+    """argparse type: a number of type cast greater than 0."""
+    def parse(text):
+        try:
+            value = cast(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid number: {}".format(text))
+        if value <= 0:
+            raise argparse.ArgumentTypeError("must be greater than 0, got {}".format(text))
+        return value
+    return parse
+
 
 if __name__ == "__main__":
-    print "--- STARTING A* CHOREOGRAPHY ENGINE ---"
+    parser = argparse.ArgumentParser(description="NAO choreography planner")
+    parser.add_argument("port", nargs="?", help="NAOqi port of the (virtual) robot")
+    parser.add_argument("--solver", choices=sorted(SOLVERS), default="portfolio",
+                        help="planning algorithm (default: portfolio)")
+    parser.add_argument("--deadline", type=float, default=PLANNING_DEADLINE,
+                        help="seconds the portfolio solvers may run (default: 60)")
+    parser.add_argument("--closed-limit", type=int, default=None,
+                        help="max explored states kept in memory by A*; older ones are "
+                             "evicted and may be analyzed again (default: unbounded)")
+    parser.add_argument("--trace", metavar="FILE", default=None,
+                        help="write a binary trace of every A* expansion to FILE "
+                             "(astar solver only; load it with planning.trace.load_trace)")
+    parser.add_argument("--segment-length", type=float, default=SEGMENT_LENGTH,
+                        help="seconds per segment for the segments solver (default: 30)")
+    parser.add_argument("--stream", action="store_true",
+                        help="start dancing after planning only the first --horizon seconds "
+                             "and plan the rest while the robot dances")
+    parser.add_argument("--horizon", type=float, default=STREAM_HORIZON,
+                        help="seconds planned ahead in streaming mode (default: 20)")
+    parser.add_argument("--macros", action="store_true",
+                        help="also search with macro-actions: chains of up to 4 moves "
+                             "with few alternatives, enumerated from the compatibility graph, "
+                             "and the chains that recur in the plans of " + PLAN_CACHE_DIR)
+    parser.add_argument("--time-step", type=positive(float), default=0.1,
+                        help="time quantization of the search states in seconds (default: 0.1)")
+    parser.add_argument("--boredom-bucket", type=positive(int), default=1,
+                        help="merge states whose moves were last used within the same "
+                             "bucket of steps (default: 1, exact)")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="explore only one of every two mirror-image partial plans "
+                             "(e.g. DiagonalLeft/DiagonalRight), detected from the catalog")
+    parser.add_argument("--catalog-durations", action="store_true",
+                        help="plan with the durations written in the catalog instead of the "
+                             "ones read from the keyframe timelines or measured by --calibrate")
+    parser.add_argument("--calibrate", type=int, metavar="RUNS", default=0,
+                        help="run every move without a keyframe timeline RUNS times against a "
+                             "simulated robot, save the measured durations to " +
+                             CALIBRATION_FILE + " and exit")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="simulated latency of every robot call in seconds, for --calibrate "
+                             "(default: 0.02)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always search, without reading or writing " + PLAN_CACHE_DIR)
+    parser.add_argument("--beats", action="store_true",
+                        help="prefer starting moves on the beats and downbeats of the song, "
+                             "analysed once (cached in " + BEAT_CACHE + ")")
+    parser.add_argument("--playlist", metavar="FILE", default=None,
+                        help="plan and dance every song of a JSON playlist (see planning/playlist.py); "
+                             "the first song starts as soon as it is planned")
+    parser.add_argument("--duration-quantile", choices=["p50", "p95"], default="p95",
+                        help="measured duration to plan with (default: p95)")
+    args = parser.parse_args()
+
+    print "--- STARTING {} CHOREOGRAPHY ENGINE ---".format(
+        "A*" if args.solver == "astar" else args.solver.upper()
+    )
+    PLANNING_DEADLINE = args.deadline
+    CLOSED_LIMIT = args.closed_limit
+    TRACE_FILE = args.trace
+    SEGMENT_LENGTH = args.segment_length
+    STREAM_HORIZON = args.horizon
 
     # Allow setting port from command line
-    global PORT
-    if len(sys.argv) > 1:
+    if args.port is not None:
         try:
-            PORT = int(sys.argv[1])
+            PORT = int(args.port)
             print "[Config] Port set from command line:", PORT
         except ValueError:
             print "[Config] Invalid port provided. Using default:", PORT
@@ -323,30 +885,138 @@ if __name__ == "__main__":
         print "[Config] Using default port:", PORT
 
 
-    MANDATORY_MOVES = [
-        Stand, StandZero, Sit, SitRelax, Hello, WipeForehead
-    ]
+    if args.calibrate:
+        # Moves with a keyframe timeline or made of postures only are left to the catalog
+        folder = os.path.dirname(CATALOG_FILE)
+        untimed = [m for m in CATALOG if needs_calibration(module_source(m, folder).decode("latin-1"))]
+        print "[Calibration] Running {} moves {} times, {:.3f}s latency per call...".format(
+            len(untimed), args.calibrate, args.latency
+        )
+        results = calibrate(untimed, runs=args.calibrate, latency=args.latency,
+                            jitter=args.latency / 2, display=True,
+                            digests={m.name: module_digest(m, folder) for m in untimed})
+        save_calibration(CALIBRATION_FILE, results, args.latency, args.latency / 2)
+        print "[Calibration] {} moves written to {}".format(len(results), CALIBRATION_FILE)
+        sys.exit(0)
+
+    if not args.catalog_durations:
+        apply_durations(args.duration_quantile, display=True)
+
+    MANDATORY_MOVES = [MOVES[name] for name in (
+        "Stand", "StandZero", "Sit", "SitRelax", "Hello", "WipeForehead"
+    )]
     print "MANDATORY REQUIREMENTS: ", [m.name for m in MANDATORY_MOVES]
 
+    cache = None if args.no_cache else PlanCache(PLAN_CACHE_DIR, PLAN_CACHE_BYTES)
+    macros = ()
+    if args.macros:
+        macros = enumerate_macros(ALL_MOVES)
+        mined = cached_macros(cache, set(macros)) if cache is not None else []
+        print "[Config] Macros: {} enumerated, {} mined from {}".format(len(macros), len(mined), PLAN_CACHE_DIR)
+        macros += mined
+
+    # Graph and lookup tables built once for every song of a playlist
+    shared_tables = {}
+    beat_grid = song_beats(SONG_FILENAME) if args.beats and not args.playlist else None
+
     problem = DanceProblem(
-        start_move=StandInit,
-        goal_move=Crouch,
+        start_move=MOVES["StandInit"],
+        goal_move=MOVES["Crouch"],
         mandatory_moves=MANDATORY_MOVES,
         all_moves_list=ALL_MOVES,
-        partitions=PARTITION_MAP
+        partitions=PARTITION_MAP,
+        time_step=args.time_step,
+        boredom_bucket=args.boredom_bucket,
+        macros=macros,
+        symmetry=args.symmetry,
+        beats=beat_grid,
+        shared=shared_tables
+    )
+
+    report = problem.quantization_report()
+    print "[Config] Quantization: {}s time steps, boredom bucket of {} steps".format(
+        report["time_step"], report["boredom_bucket"]
     )
+    print "[Config] Worst case: {:.2f}s of song unused, plan cost within {:.1f} of exact".format(
+        report["max_unused_time"], report["max_cost_error"]
+    )
+
+    if args.solver == "dp":
+        transitions, table_bytes = dp_budget(problem)
+        print "[Config] DP: {} transitions, {:.0f} MB of tables (limit: {:.0f} MB)".format(
+            transitions, table_bytes / 1e6, DP_MAX_BYTES / 1e6
+        )
+        if table_bytes > DP_MAX_BYTES:
+            print "[Status] FAILURE: the DP tables do not fit in memory. " \
+                  "Use a larger --time-step or another solver."
+            sys.exit(1)
+
+    if args.playlist:
+        try:
+            songs = load_playlist(args.playlist, MOVES, problem.start_move, problem.goal_move,
+                                  MANDATORY_MOVES, problem.MAX_DURATION, find_hub(problem))
+        except (IOError, ValueError) as e:
+            print "[Playlist] ERROR: {}".format(e)
+            sys.exit(1)
+        STATS_FILE = None   # The song processes would race on the ETA history file
+        problems = [DanceProblem(
+            start_move=song["start"],
+            goal_move=song["goal"],
+            mandatory_moves=song["mandatory"],
+            all_moves_list=ALL_MOVES,
+            partitions=PARTITION_MAP,
+            time_step=args.time_step,
+            boredom_bucket=args.boredom_bucket,
+            macros=problem.macros,
+            max_duration=song["duration"],
+            symmetry=args.symmetry,
+            beats=song_beats(song["file"]) if args.beats else None,
+            shared=shared_tables
+        ) for song in songs]
+        # Found now rather than after the songs before it have been danced
+        infeasible = [k for k, song_problem in enumerate(problems) if not song_problem.is_feasible()]
+        for k in infeasible:
+            print "[Playlist] ERROR: song {} ({}): {:.0f}s cannot fit its mandatory moves and {}".format(
+                k + 1, songs[k]["file"], songs[k]["duration"], songs[k]["goal"].name
+            )
+        if infeasible:
+            sys.exit(1)
+        print "\n[Playlist] Planning {} songs in parallel...".format(len(songs))
+        perform_playlist(songs, problems, SOLVERS[args.solver], cache, args.solver + "-")
+        sys.exit(0)
+
+    if args.stream:
+        print "\n[Status] Streaming mode: planning {:.0f}s ahead while dancing...".format(
+            STREAM_HORIZON
+        )
+        execute_choreography(stream_choreography(problem))
+        stop_music()
+        sys.exit(0)
+
+    cache_key = "{}-{}".format(args.solver, problem.fingerprint())
+    cached = cache.get(cache_key) if cache else None
 
-    print "\n[Status] Starting Search Algorithm (This may take a moment)..."
     start_t = time.time()
-    solution = astar_search(problem)
+    if cached:
+        print "\n[Cache] Same show planned before: reusing the stored plan"
+        solution = replay(problem, [problem.move_to_index[MOVES[name]] for name in cached["plan"][1:]])
+    else:
+        print "\n[Status] Starting Search Algorithm (This may take a moment)..."
+        solution = SOLVERS[args.solver](problem)
     end_t = time.time()
 
+    if solution and cache and not cached:
+        cache.put(cache_key, [m.name for m in problem.plan_moves(solution)], solution.path_cost,
+                  {"search_time": end_t - start_t, "nodes_explored": problem.nodes_explored})
+
     if solution:
         print "\n[Status] SOLUTION FOUND!"
-        choreography = [n.state[0] for n in solution.path()]
-        total_duration = solution.state[2]
+        choreography = problem.plan_moves(solution)
+        total_duration = sum(m.execution_time for m in choreography)
 
         print "Search Time: {:.4f}s".format(end_t - start_t)
+        if problem.nodes_explored:
+            print "Partial Plans Analyzed: {}".format(problem.nodes_explored)
         print "Total Moves: {}".format(len(choreography))
         print "Total Duration: {:.2f}s (Limit: 120s)".format(total_duration)
         print "-" * 60
@@ -366,22 +1036,8 @@ if __name__ == "__main__":
 
         move_names = [m.name for m in choreography]
 
-        if os.path.exists(SONG_FILENAME):
-            print "\n[Music] Loading: {}".format(SONG_FILENAME)
-            pygame.mixer.init()
-            pygame.mixer.music.load(SONG_FILENAME)
-            print "[Music] Playing..."
-            pygame.mixer.music.play()
-        else:
-            print "\n[Music] WARNING: File '{}' not found. Dancing without music.".format(
-                SONG_FILENAME
-            )
-
-        execute_choreography(choreography)
-
-        if pygame.mixer.get_init():
-            pygame.mixer.music.stop()
-            print "[Music] Stopped."
+        execute_choreography(choreography, problem, on_ready=start_music)
+        stop_music()
     else:
         print "\n[Status] FAILURE: No plan found."
         print "Possible reasons: Time limit too short or incompatible mandatory moves."
@@ -0,0 +1,211 @@
+"""
+Offline beat analysis of the song.
+
+The song is decoded to mono 16-bit PCM (WAV files with the wave module, any
+other format through ffmpeg) and analysed with NumPy only:
+
+- onset strength: positive spectral flux of the log-magnitude STFT above its
+  running mean, over the whole spectrum for beats and under 200 Hz (kick
+  drum, bass) for downbeats;
+- tempo: the autocorrelation peak of the onset strength between 60 and
+  200 BPM, weighted towards 120 BPM;
+- beats: dynamic programming over the onset strength that rewards strong
+  onsets and penalizes beat intervals far from the tempo (Ellis, 2007);
+- downbeats: every 4th beat (4/4), starting at the phase whose beats have the
+  strongest low-frequency onsets.
+
+Grids are cached in a JSON file keyed by the SHA-1 of the audio file, so a
+song is only analysed again after it changes. BeatGrid.costs() turns a grid
+into one cost per time tick, looked up in O(1) by the planners.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import subprocess
+import wave
+
+import numpy as np
+
+
+SAMPLE_RATE = 22050
+FRAME = 2048
+HOP = 512
+LOCAL_MEAN = 16         # Hops of the running mean taken off the onset strength
+MIN_BPM, MAX_BPM, PRIOR_BPM = 60.0, 200.0, 120.0
+TIGHTNESS = 100.0       # How strictly beat intervals follow the tempo
+BEATS_PER_BAR = 4
+ANALYSIS_VERSION = 1    # Part of the cache key: bump it when the analysis changes
+
+
+class BeatGrid(object):
+    """Beat and downbeat times of a song, in seconds from the start of the
+    show (offset seconds into the song)."""
+
+    def __init__(self, digest, tempo, beats, downbeats, offset=0.0):
+        self.digest = digest
+        self.tempo = tempo
+        self.beats = np.asarray(beats, dtype=float)
+        self.downbeats = np.asarray(downbeats, dtype=float)
+        self.offset = offset
+
+    def key(self):
+        return "{}@{:.3f}".format(self.digest, self.offset)
+
+    def shifted(self, offset):
+        """The grid seen from a show starting offset seconds later."""
+        return BeatGrid(self.digest, self.tempo, self.beats - offset, self.downbeats - offset,
+                        self.offset + offset)
+
+    def costs(self, time_step, count, beat_penalty, downbeat_penalty):
+        """Cost of starting a move at each of count ticks of time_step seconds:
+        beat_penalty half a beat away from the nearest beat (0 on a beat,
+        linear in between) plus downbeat_penalty half a bar away from the
+        nearest downbeat."""
+        times = np.arange(count) * time_step
+        return (beat_penalty * _off_grid(times, self.beats) +
+                downbeat_penalty * _off_grid(times, self.downbeats)).tolist()
+
+
+def _off_grid(times, grid):
+    """Distance of times to the nearest grid point over half the grid spacing, capped at 1."""
+    if len(grid) < 2:
+        return np.zeros(len(times))
+    k = np.clip(np.searchsorted(grid, times), 1, len(grid) - 1)
+    distance = np.minimum(np.abs(times - grid[k - 1]), np.abs(grid[k] - times))
+    return np.minimum(1.0, distance / (np.median(np.diff(grid)) / 2.0))
+
+
+def decode(path, rate=SAMPLE_RATE):
+    """Mono PCM samples of an audio file as floats in [-1, 1], and their rate."""
+    if path.lower().endswith(".wav"):
+        f = wave.open(path, "rb")
+        try:
+            if f.getsampwidth() != 2:
+                raise ValueError("{}: only 16-bit WAV files are supported".format(path))
+            channels, rate = f.getnchannels(), f.getframerate()
+            data = f.readframes(f.getnframes())
+        finally:
+            f.close()
+    else:
+        try:
+            ffmpeg = subprocess.Popen(["ffmpeg", "-v", "error", "-i", path, "-f", "s16le",
+                                       "-ac", "1", "-ar", str(rate), "-"],
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError:
+            raise IOError("decoding {} needs ffmpeg (or a WAV file)".format(path))
+        data, error = ffmpeg.communicate()
+        if ffmpeg.returncode:
+            raise IOError("ffmpeg cannot decode {}: {}".format(path, error.decode("latin-1").strip()))
+        channels = 1
+    samples = np.frombuffer(data, dtype="<i2").astype(float) / 32768.0
+    return samples.reshape(-1, channels).mean(axis=1), rate
+
+
+def onset_strength(samples, rate, max_hz=None):
+    """Positive spectral flux per hop of HOP samples, of the frequencies under
+    max_hz (all if None)."""
+    if len(samples) < FRAME:
+        samples = np.concatenate([samples, np.zeros(FRAME - len(samples))])
+    frames = 1 + (len(samples) - FRAME) // HOP
+    bins = FRAME // 2 + 1 if max_hz is None else int(max_hz * FRAME / float(rate)) + 1
+    window = np.hanning(FRAME)
+    spectrum = np.empty((frames, bins))
+    for start in range(0, frames, 1024):
+        rows = np.arange(start, min(frames, start + 1024))
+        chunk = samples[rows[:, None] * HOP + np.arange(FRAME)[None, :]]
+        spectrum[rows] = np.log1p(1000.0 * np.abs(np.fft.rfft(chunk * window, axis=1)[:, :bins]))
+    flux = np.concatenate([[0.0], np.maximum(0.0, np.diff(spectrum, axis=0)).sum(axis=1)])
+    # Only the flux above its running mean (over about 0.4 s) marks an onset, not steady noise
+    window = np.ones(LOCAL_MEAN)
+    background = (np.convolve(flux, window, mode="same") /
+                  np.convolve(np.ones(len(flux)), window, mode="same"))
+    return np.maximum(0.0, flux - background)
+
+
+def estimate_period(onsets, rate):
+    """Beat period in hops: autocorrelation peak of the onset strength within
+    MIN_BPM..MAX_BPM, weighted by a log-normal prior around PRIOR_BPM."""
+    hops_per_minute = 60.0 * rate / HOP
+    onsets = onsets - onsets.mean()
+    spectrum = np.fft.rfft(onsets, 2 * len(onsets))
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:len(onsets)]
+    lags = np.arange(int(hops_per_minute / MAX_BPM), int(hops_per_minute / MIN_BPM) + 1)
+    lags = lags[(lags > 0) & (lags < len(onsets))]
+    if len(lags) == 0:
+        raise ValueError("the song is too short to find its tempo")
+    prior = np.exp(-0.5 * np.log2(hops_per_minute / lags / PRIOR_BPM) ** 2)
+    return int(lags[np.argmax(autocorrelation[lags] * prior)])
+
+
+def track_beats(onsets, period):
+    """Hop indices of the beats: the sequence maximizing the onset strength at
+    the beats minus TIGHTNESS * log(interval / period)^2 per interval."""
+    score = onsets / (onsets.std() or 1.0)
+    total = score.copy()
+    previous = np.full(len(score), -1, dtype=int)
+    for t in range(period // 2 + 1, len(score)):
+        candidates = np.arange(max(0, t - 2 * period), t - period // 2)
+        transition = total[candidates] - TIGHTNESS * np.log((t - candidates) / float(period)) ** 2
+        best = np.argmax(transition)
+        if transition[best] > 0:
+            total[t] += transition[best]
+            previous[t] = candidates[best]
+    beats = [int(np.argmax(total[-period:])) + max(0, len(total) - period)]
+    while previous[beats[-1]] >= 0:
+        beats.append(previous[beats[-1]])
+    beats.reverse()
+    # Beats in the silence or noise before and after the music are dropped: their
+    # onsets are weaker than half the RMS onset strength at the beats
+    local = np.maximum.reduce([np.roll(onsets, shift) for shift in range(-2, 3)])
+    strong = local[beats] >= 0.5 * np.sqrt(np.mean(local[beats] ** 2))
+    if not strong.any():
+        return beats
+    first, last = np.argmax(strong), len(beats) - np.argmax(strong[::-1])
+    return beats[first:last]
+
+
+def analyse(path):
+    """BeatGrid of the audio file at path (not cached)."""
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    samples, rate = decode(path)
+    onsets = onset_strength(samples, rate)
+    period = estimate_period(onsets, rate)
+    beats = track_beats(onsets, period)
+    low = onset_strength(samples, rate, max_hz=200.0)
+    phase = max(range(BEATS_PER_BAR), key=lambda k: low[beats[k::BEATS_PER_BAR]].mean()
+                if beats[k::BEATS_PER_BAR] else 0.0)
+    # Hop k is the frame starting at k * HOP samples: its onset time is the frame center
+    seconds = HOP / float(rate)
+    center = FRAME / 2.0 / rate
+    return BeatGrid(digest, 60.0 / (period * seconds), [b * seconds + center for b in beats],
+                    [b * seconds + center for b in beats[phase::BEATS_PER_BAR]])
+
+
+def load_beats(path, cache_file=None):
+    """BeatGrid of the audio file at path, analysed once per file content and
+    then read from cache_file."""
+    with open(path, "rb") as f:
+        key = "{}:{}".format(hashlib.sha1(f.read()).hexdigest(), ANALYSIS_VERSION)
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            cache = {}
+    if key in cache:
+        entry = cache[key]
+        return BeatGrid(key.split(":")[0], entry["tempo"], entry["beats"], entry["downbeats"])
+
+    grid = analyse(path)
+    if cache_file:
+        cache[key] = {"tempo": round(grid.tempo, 2),
+                      "beats": [round(b, 3) for b in grid.beats.tolist()],
+                      "downbeats": [round(b, 3) for b in grid.downbeats.tolist()]}
+        with open(cache_file, "w") as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+    return grid
@@ -0,0 +1,77 @@
+"""
+On-disk plan cache.
+
+Plans are stored one JSON file per key in a directory, the key being a
+content hash of everything the plan depends on (DanceProblem.fingerprint()
+and the solver), so a change of catalog, durations, mandatory moves or
+weights simply leads to a different file. The directory is kept under
+max_bytes by deleting the least recently used plans (hits refresh the file
+modification time).
+"""
+
+import json
+import os
+import time
+
+
+class PlanCache(object):
+    """Plans by key in directory, at most max_bytes in total."""
+
+    def __init__(self, directory, max_bytes=1 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """The entry stored for key, or None."""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        os.utime(path, None)
+        return entry
+
+    def put(self, key, plan, cost, stats=None):
+        """Store a plan (list of move names) with its cost and search stats,
+        then evict the least recently used plans over max_bytes."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        entry = {"plan": list(plan), "cost": cost, "stats": stats or {}, "created": time.time()}
+        # Written under a temporary name, so a concurrent reader never sees half a plan
+        temporary = self.path(key) + ".tmp{}".format(os.getpid())
+        with open(temporary, "w") as f:
+            json.dump(entry, f, indent=1, sort_keys=True)
+        os.rename(temporary, self.path(key))
+        self.evict()
+
+    def plans(self):
+        """The plans (lists of move names) of every entry in the cache."""
+        if not os.path.isdir(self.directory):
+            return []
+        plans = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        plans.append(json.load(f)["plan"])
+                except (IOError, OSError, ValueError, KeyError):
+                    continue
+        return plans
+
+    def evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
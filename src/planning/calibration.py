@@ -0,0 +1,226 @@
+"""
+Duration calibration against a simulated NAOqi.
+
+Moves made of setAngles and time.sleep calls, moveTo walks or posture
+changes have no keyframe timeline to read their duration from. calibrate()
+runs them instead: every move's main() is called `runs` times with ALProxy
+replaced by SimulatedProxy and `time` replaced by a SimulatedClock, so the
+run takes no real time and needs no robot. Every proxy call costs a random
+latency; blocking motion calls also last as long as the motion
+(angleInterpolation: its last keyframe, moveTo: a start/stop overhead plus
+distance over walking speed, goToPosture: posture_time over the speed
+fraction), while `post.` calls return at once, as on the robot.
+
+The p50 and p95 of the measured times are written to a JSON calibration
+file with the SHA-1 of every move's module source; load_calibration() reads
+them back as {move name: seconds}, leaving out the moves whose module has
+changed since they were measured.
+"""
+
+from __future__ import print_function
+
+import json
+import math
+import os
+import random
+import re
+import sys
+import types
+
+from planning.keyframes import keyframe_duration
+
+
+# Calls whose duration cannot be read from the source
+TIMED = re.compile(r"\b(?:sleep|setAngles|moveTo|positionInterpolation)\(")
+
+
+class SimulatedClock(object):
+    """Stand-in for the time module: sleep() only moves the clock forward."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+def _longest(times):
+    """Largest number in a (possibly nested) list of keyframe times."""
+    if isinstance(times, (list, tuple)):
+        return max([_longest(t) for t in times] or [0.0])
+    return float(times)
+
+
+class SimulatedRobot(object):
+    """Timing model of the robot behind the simulated proxies. Every call costs
+    a latency drawn from N(latency, jitter); blocking motion calls then last
+    as long as the motion. goToPosture costs nothing more if the robot is
+    already in that posture (any other motion leaves it in none)."""
+
+    def __init__(self, clock, latency=0.02, jitter=0.01, walk_speed=0.1, walk_overhead=2.5,
+                 turn_speed=0.5, posture_time=1.0, posture="Stand", rng=None):
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.walk_speed = walk_speed
+        self.walk_overhead = walk_overhead
+        self.turn_speed = turn_speed
+        self.posture_time = posture_time
+        self.posture = posture
+        self.rng = rng or random.Random(0)
+
+    def motion_time(self, method, args):
+        if method == "angleInterpolation" and len(args) >= 3:
+            return _longest(args[2])
+        if method == "angleInterpolationBezier" and len(args) >= 2:
+            return _longest(args[1])
+        if method == "positionInterpolation" and len(args) >= 5:
+            return _longest(args[4])
+        if method == "moveTo" and len(args) >= 3:
+            return (self.walk_overhead + math.hypot(args[0], args[1]) / self.walk_speed +
+                    abs(args[2]) / self.turn_speed)
+        if method == "goToPosture" and len(args) >= 2:
+            return 0.0 if args[0] == self.posture else self.posture_time / max(args[1], 0.01)
+        return 0.0
+
+    def call(self, method, args, blocking):
+        self.clock.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        duration = self.motion_time(method, args)
+        if blocking:
+            self.clock.sleep(duration)
+        if method == "goToPosture":
+            self.posture = args[0]
+        elif duration:
+            self.posture = None
+        if method == "getRobotPosition":
+            return [0.0, 0.0, 0.0]
+        return True
+
+
+class SimulatedProxy(object):
+    """Stand-in for ALProxy on a SimulatedRobot; methods called through
+    `post` do not wait for the motion to end."""
+
+    def __init__(self, robot, blocking=True):
+        self.robot = robot
+        self.blocking = blocking
+
+    @property
+    def post(self):
+        return SimulatedProxy(self.robot, blocking=False)
+
+    def __getattr__(self, method):
+        return lambda *args: self.robot.call(method, args, self.blocking)
+
+
+class _Pose2D(object):
+    def __init__(self, x=0.0, y=0.0, theta=0.0):
+        if isinstance(x, (list, tuple)):
+            x, y, theta = x
+        self.x, self.y, self.theta = x, y, theta
+
+    def __mul__(self, other):
+        return _Pose2D(self.x + other.x, self.y + other.y, self.theta + other.theta)
+
+
+def install_standins():
+    """Register minimal naoqi, motion and almath modules if the NAOqi SDK is
+    not installed, so the move modules can be imported for calibration."""
+    standins = {
+        "naoqi": {"ALProxy": None},
+        "motion": {"FRAME_TORSO": 0, "FRAME_WORLD": 1, "FRAME_ROBOT": 2},
+        "almath": {"PI": math.pi, "TO_RAD": math.pi / 180, "TO_DEG": 180 / math.pi,
+                   "Pose2D": _Pose2D},
+    }
+    for name, attributes in standins.items():
+        try:
+            __import__(name)
+        except ImportError:
+            module = types.ModuleType(name)
+            module.__dict__.update(attributes)
+            sys.modules[name] = module
+
+
+def needs_calibration(source):
+    """True for move sources without keyframe lists whose duration depends on
+    sleeps, setAngles, walks or Cartesian motions."""
+    return keyframe_duration(source) is None and bool(TIMED.search(source))
+
+
+def measure(module, robot):
+    """Simulated seconds taken by one call of module.main() on robot."""
+    saved = {name: module.__dict__.get(name) for name in ("ALProxy", "time")}
+    clock = robot.clock
+    module.ALProxy = lambda *args: SimulatedProxy(robot)
+    module.time = clock
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = clock.time()
+        module.main("127.0.0.1", 9559)
+        return clock.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        module.__dict__.update(saved)
+
+
+def percentile(samples, q):
+    """q-th percentile (0-100) of samples, by linear interpolation."""
+    samples = sorted(samples)
+    k = (len(samples) - 1) * q / 100.0
+    low = int(math.floor(k))
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (k - low)
+
+
+def calibrate(moves, runs=20, latency=0.02, jitter=0.01, seed=0, display=False, digests=None,
+              **robot_settings):
+    """Run every move `runs` times on a SimulatedRobot (robot_settings are
+    passed on to it). Returns {move name: {"p50": s, "p95": s, "runs": runs,
+    "sha1": digest}}, digest taken from digests {move name: SHA-1 of its
+    module source}; moves whose main() fails are left out."""
+    install_standins()
+    rng = random.Random(seed)
+    results = {}
+    for move in moves:
+        try:
+            module = move.load()
+            samples = [measure(module, SimulatedRobot(SimulatedClock(), latency, jitter, rng=rng,
+                                                      **robot_settings))
+                       for _ in range(runs)]
+        except Exception as e:
+            if display:
+                print("[Calibration] {} failed: {}".format(move.name, e))
+            continue
+        results[move.name] = {
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "runs": runs,
+            "sha1": (digests or {}).get(move.name),
+        }
+        if display:
+            print("[Calibration] {:<20} p50 {:6.2f}s  p95 {:6.2f}s".format(
+                move.name, results[move.name]["p50"], results[move.name]["p95"]))
+    return results
+
+
+def save_calibration(path, results, latency, jitter):
+    with open(path, "w") as f:
+        json.dump({"latency": latency, "jitter": jitter, "moves": results}, f,
+                  indent=1, sort_keys=True)
+
+
+def load_calibration(path, quantile="p95", digests=None):
+    """{move name: measured duration} from a calibration file, or {} if
+    there is none. Given digests {move name: SHA-1 of its module source},
+    the moves measured on another version of their module are left out."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        moves = json.load(f).get("moves", {})
+    return {name: stats[quantile] for name, stats in moves.items()
+            if digests is None or stats.get("sha1") == digests.get(name)}
@@ -0,0 +1,64 @@
+"""
+Declarative move catalog.
+
+The moves are described in a JSON file (moves/catalog.json):
+
+    {"moves": [
+        {"name": "Sit", "module": "sit", "duration": 9.50, "category": "LOW",
+         "compatibles": ["SitRelax", "Stand", "StandZero"]},
+        ...
+    ]}
+
+`module` is the module of the move in the moves package, next to the
+catalog; it is only checked to exist here, and imported by Move the first
+time the move is executed. Every mistake in the file is reported at load
+time with a ValueError.
+"""
+
+import json
+import os
+
+
+CATEGORIES = ("HIGH", "MID", "LOW")
+FIELDS = ("name", "module", "duration", "category", "compatibles")
+
+
+def load_catalog(path, make_move, package="moves"):
+    """Read and validate the catalog at path. make_move(name, module, duration)
+    builds a move, module being the dotted module path. Returns the list of
+    moves in file order and a dict {move: category}."""
+    with open(path) as f:
+        try:
+            entries = json.load(f)["moves"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError("{}: not a move catalog ({})".format(path, e))
+    folder = os.path.dirname(os.path.abspath(path))
+
+    moves = {}
+    order = []
+    for k, entry in enumerate(entries):
+        where = "{}: move {}".format(path, entry.get("name", k + 1) if isinstance(entry, dict) else k + 1)
+        if not isinstance(entry, dict) or sorted(entry) != sorted(FIELDS):
+            raise ValueError("{}: expected exactly the fields {}".format(where, ", ".join(FIELDS)))
+        name = entry["name"]
+        if name in moves:
+            raise ValueError("{}: duplicate name".format(where))
+        if not os.path.exists(os.path.join(folder, entry["module"] + ".py")):
+            raise ValueError("{}: no module {}.{}".format(where, package, entry["module"]))
+        if not isinstance(entry["duration"], (int, float)) or entry["duration"] <= 0:
+            raise ValueError("{}: duration must be a positive number of seconds".format(where))
+        if entry["category"] not in CATEGORIES:
+            raise ValueError("{}: category must be one of {}".format(where, ", ".join(CATEGORIES)))
+        # str() keeps names and module paths byte strings on Python 2
+        moves[name] = make_move(str(name), str(package + "." + entry["module"]), float(entry["duration"]))
+        order.append(entry)
+
+    categories = {}
+    for entry in order:
+        move = moves[entry["name"]]
+        unknown = [c for c in entry["compatibles"] if c not in moves]
+        if unknown:
+            raise ValueError("{}: move {}: unknown compatibles {}".format(path, move.name, ", ".join(unknown)))
+        move.add_compatibles([moves[c] for c in entry["compatibles"]])
+        categories[move] = entry["category"]
+    return [moves[entry["name"]] for entry in order], categories
@@ -0,0 +1,165 @@
+"""
+Dynamic-programming planner for DanceProblem.
+
+Time is counted in the ticks of the problem (time_step seconds, durations
+rounded up, exactly as in DanceProblem) and the tables are indexed by
+(tick, current move, pending-mandatory bitmask). They are filled
+tick by tick, so the planning cost is a predictable
+O(moves^2 * 2^mandatory * ticks), checked with dp_budget() against
+max_bytes before any table is allocated.
+
+The boredom score depends on the whole history of a plan, which does not fit
+in a (move, mask, tick) cell. Every cell therefore keeps only its cheapest
+plan so far, with the last `window` moves of it: a move found in the window
+is scored exactly, a move not found in it is scored as if it was last used
+`window` steps ago. A plan that is dearer up to a cell but would collect
+more boredom bonus afterwards is dropped, so the result is a good plan, not
+necessarily the cheapest one.
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from aima.search import Node
+
+
+MAX_BYTES = 1 << 30     # dp_search refuses problems whose tables need more memory
+
+
+def dp_budget(problem, window=16):
+    """Return (transitions, table_bytes) that dp_search will need for problem."""
+    n = len(problem.all_moves_list)
+    masks = problem.full_mask + 1
+    ticks = problem.max_ticks + 1
+    cells = ticks * n * masks
+    # cost (8) + steps (2) + parent move (2) + parent mask (4) + window of moves (2 each)
+    return n * n * masks * ticks, cells * (16 + 2 * window)
+
+
+def dp_search(problem, window=16, display=False, max_bytes=MAX_BYTES):
+    """Solve a DanceProblem by dynamic programming over discretized time.
+    Returns the goal Node of the best plan (rebuilt through the problem, so
+    path_cost and states match astar_search) or None if no plan exists.
+    Raises ValueError if the tables would need more than max_bytes."""
+    start_t = time.time()
+
+    table_bytes = dp_budget(problem, window)[1]
+    if max_bytes is not None and table_bytes > max_bytes:
+        raise ValueError("The DP tables would need {:.0f} MB (limit: {:.0f} MB)".format(
+            table_bytes / 1e6, max_bytes / 1e6))
+
+    moves = problem.all_moves_list
+    n = len(moves)
+    index = problem.move_to_index
+
+    # Same pending-mandatory bitmask encoding as the problem states
+    bit = np.zeros(n, dtype=np.int32)
+    for m, b in problem.mandatory_bit.items():
+        bit[index[m]] = b
+    full_mask = problem.full_mask
+    n_masks = full_mask + 1
+
+    # Same ticks as the problem, so the plan replays within its max_ticks
+    dur = np.array(problem.ticks, dtype=np.int32)
+    seconds = problem.graph.durations
+    rate = problem.graph.rates
+    max_tick = problem.max_ticks
+    beat_cost = problem.beat_cost
+
+    # Moves that can precede each move (self-repeats are never allowed)
+    preds = problem.graph.predecessors
+
+    clumping = np.zeros((n, n))
+    for p in moves:
+        if p in problem.all_mandatory_moves and p.name != "StandInit":
+            for m in problem.all_mandatory_moves:
+                clumping[index[p], index[m]] = problem.CLUMPING_PENALTY
+
+    cost = np.full((max_tick + 1, n, n_masks), np.inf)
+    steps = np.zeros((max_tick + 1, n, n_masks), dtype=np.int16)
+    # Move indices in int16: catalogs are not limited to 127 moves
+    recent = np.full((max_tick + 1, n, n_masks, window), -1, dtype=np.int16)
+    parent_move = np.full((max_tick + 1, n, n_masks), -1, dtype=np.int16)
+    parent_mask = np.zeros((max_tick + 1, n, n_masks), dtype=np.int32)
+
+    s = index[problem.start_move]
+    t0 = dur[s]
+    if t0 > max_tick:
+        return None
+    cost[t0, s, full_mask] = 0.0
+    recent[t0, s, full_mask, 0] = s
+
+    all_masks = np.arange(n_masks, dtype=np.int32)
+    transitions = 0
+
+    for t in range(t0 + 1, max_tick + 1):
+        for m in range(n):
+            ts = t - dur[m]
+            if ts < t0 or len(preds[m]) == 0:
+                continue
+            src = cost[ts, preds[m]]
+            if not np.isfinite(src).any():
+                continue
+            transitions += src.size
+
+            # Boredom: position of m in the window is the number of steps since its last use
+            window_src = recent[ts, preds[m]]
+            steps_src = steps[ts, preds[m]]
+            match = window_src == m
+            gap = np.where(match.any(axis=-1), match.argmax(axis=-1),
+                           np.minimum(steps_src, window))
+
+            candidate = (src + seconds[m] + beat_cost[ts]
+                         + clumping[preds[m], m][:, None]
+                         - gap * rate[m] * problem.AESTHETIC_WEIGHT)
+            best_p = candidate.argmin(axis=0)
+            best = candidate[best_p, all_masks]
+
+            # Merge the source masks that collapse onto the same target mask
+            if bit[m]:
+                lo = all_masks[(all_masks & bit[m]) == 0]
+                hi = lo | bit[m]
+                src_mask = np.where(best[hi] < best[lo], hi, lo)
+            else:
+                src_mask = all_masks
+            src_mask = src_mask[np.isfinite(best[src_mask])]
+            if len(src_mask) == 0:
+                continue
+            dst_mask = src_mask & ~bit[m]
+            p = preds[m][best_p[src_mask]]
+
+            cost[t, m, dst_mask] = best[src_mask]
+            steps[t, m, dst_mask] = steps[ts, p, src_mask] + 1
+            recent[t, m, dst_mask, 0] = m
+            recent[t, m, dst_mask, 1:] = recent[ts, p, src_mask, :-1]
+            parent_move[t, m, dst_mask] = p
+            parent_mask[t, m, dst_mask] = src_mask
+
+    g = index[problem.goal_move]
+    goal_costs = cost[:, g, 0]
+    if not np.isfinite(goal_costs).any():
+        return None
+    t = int(goal_costs.argmin())
+
+    # Walk the parent pointers back to the start cell
+    sequence = []
+    m, mask = g, 0
+    while m >= 0:
+        sequence.append(moves[m])
+        p, mask = parent_move[t, m, mask], parent_mask[t, m, mask]
+        t -= dur[m]
+        m = p
+    sequence.reverse()
+
+    node = Node(problem.initial)
+    for move in sequence[1:]:
+        node = node.child_node(problem, move)
+    assert problem.goal_test(node.state), "the DP parent pointers do not lead back to the start"
+
+    if display:
+        print("DP filled {} ticks, {} transitions in {:.3f}s".format(
+            max_tick - t0, transitions, time.time() - start_t))
+    return node
@@ -0,0 +1,69 @@
+"""
+The compatibility graph compiled to move indices.
+
+MoveGraph numbers the moves in the order it is given and stores, once per
+problem, what the solvers would otherwise rebuild from Move.compatibles sets
+at every expansion: a boolean adjacency matrix and per-move successor
+bitsets (self-repeats removed), predecessor index arrays, and parallel NumPy
+arrays of durations and boredom rates.
+"""
+
+import numpy as np
+
+
+def bits(indices):
+    """Bitset (a Python int) with the given indices set."""
+    mask = 0
+    for i in indices:
+        mask |= 1 << int(i)
+    return mask
+
+
+def members(mask):
+    """Indices set in a bitset, in increasing order."""
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
+
+
+class MoveGraph(object):
+    """Compiled compatibility graph of moves; partitions maps moves to their
+    boredom rate (default_rate if missing)."""
+
+    def __init__(self, moves, partitions, default_rate=0.2):
+        self.moves = list(moves)
+        index = {m: i for i, m in enumerate(self.moves)}
+        n = len(self.moves)
+
+        self.adjacency = np.zeros((n, n), dtype=bool)
+        for i, m in enumerate(self.moves):
+            for c in m.compatibles:
+                j = index.get(c)
+                if j is not None and j != i:
+                    self.adjacency[i, j] = True
+
+        self.successor_bits = [bits(np.flatnonzero(row)) for row in self.adjacency]
+        self.predecessors = [np.flatnonzero(column).astype(np.int32) for column in self.adjacency.T]
+        self.durations = np.array([m.execution_time for m in self.moves])
+        self.rates = np.array([partitions.get(m, default_rate) for m in self.moves])
+
+    def ticks(self, time_step):
+        """Durations in time steps of time_step seconds, rounded up."""
+        return np.ceil(self.durations / time_step - 1e-9).astype(np.int64)
+
+    def fitting_bits(self, ticks, max_ticks):
+        """fits[b] is the bitset of the moves that last at most b ticks, for
+        every budget b from 0 to max_ticks."""
+        fits = []
+        mask = 0
+        by_ticks = sorted(range(len(ticks)), key=lambda i: ticks[i])
+        k = 0
+        for budget in range(max_ticks + 1):
+            while k < len(by_ticks) and ticks[by_ticks[k]] <= budget:
+                mask |= 1 << by_ticks[k]
+                k += 1
+            fits.append(mask)
+        return fits
@@ -0,0 +1,85 @@
+"""
+Move durations read from the keyframe timelines of the move modules.
+
+Moves exported from Choregraphe build `times.append([...])` lists, one per
+joint, and play them with a single angleInterpolation call; the motion lasts
+until the last keyframe of the longest list. A goToPosture call after it
+adds posture_allowance seconds. The sources are only read, never imported
+or run, so no robot connection or SDK is needed. Modules without keyframe
+lists (postures, walks, setAngles sequences) keep their catalog duration.
+
+Results are cached in a JSON file keyed by the SHA-1 of the module source.
+"""
+
+import ast
+import hashlib
+import json
+import math
+import os
+import re
+
+
+POSTURE_ALLOWANCE = 0.5     # Seconds added for a goToPosture after the keyframes
+
+TIMES = re.compile(r"times\.append\((\[[^\]]*\])\)")
+PLAY = re.compile(r"angleInterpolation(?:Bezier)?\(")
+POSTURE = re.compile(r"goToPosture\(")
+
+
+def keyframe_duration(source, posture_allowance=POSTURE_ALLOWANCE):
+    """Duration in seconds of the keyframe timeline in a module source, or
+    None if it has no keyframe lists."""
+    lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    code = "\n".join(line.split("#")[0] for line in lines)
+    ends = [ast.literal_eval(times)[-1] for times in TIMES.findall(code)
+            if ast.literal_eval(times)]
+    if not ends:
+        return None
+    duration = float(max(ends))
+    plays = [m.end() for m in PLAY.finditer(code)]
+    if plays and POSTURE.search(code, plays[-1]):
+        duration += posture_allowance
+    # Rounded up to hundredths, so the planner never underestimates a move
+    return math.ceil(duration * 100 - 1e-6) / 100
+
+
+def module_source(move, folder):
+    """Source (bytes) of the module of a move in the moves package at folder."""
+    with open(os.path.join(folder, move.module.split(".")[-1] + ".py"), "rb") as f:
+        return f.read()
+
+
+def module_digest(move, folder):
+    """SHA-1 (hex) of the module source of a move."""
+    return hashlib.sha1(module_source(move, folder)).hexdigest()
+
+
+def derive_durations(moves, folder, cache_file=None, posture_allowance=POSTURE_ALLOWANCE):
+    """Set the execution_time of every move whose module (in folder) has
+    keyframe lists. Returns {move: (old duration, new duration)} for the
+    moves whose duration changed."""
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            cache = {}
+
+    changed = {}
+    dirty = False
+    for move in moves:
+        source = module_source(move, folder)
+        key = "{}:{}".format(hashlib.sha1(source).hexdigest(), posture_allowance)
+        if key not in cache:
+            cache[key] = keyframe_duration(source.decode("latin-1"), posture_allowance)
+            dirty = True
+        duration = cache[key]
+        if duration is not None and duration != move.execution_time:
+            changed[move] = (move.execution_time, duration)
+            move.execution_time = duration
+
+    if cache_file and dirty:
+        with open(cache_file, "w") as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+    return changed
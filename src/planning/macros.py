@@ -0,0 +1,59 @@
+"""
+Macro-operators: chains of 2-4 compatible moves that DanceProblem offers as
+single search actions next to the single moves, so plans are found in fewer,
+larger steps.
+
+Chains are either enumerated from the compatibility graph or mined from
+previous solutions; DanceProblem compiles them into Macro objects.
+"""
+
+from collections import Counter
+
+
+class Macro(object):
+    """A compiled chain of moves. Duration (in ticks), the mandatory bits it
+    clears and the state-independent part of its cost (durations and clumping
+    penalties inside the chain) are computed once by DanceProblem."""
+
+    def __init__(self, moves, indices, ticks, mask, static_cost):
+        self.moves = tuple(moves)
+        self.indices = tuple(indices)
+        self.ticks = ticks
+        self.mask = mask
+        self.static_cost = static_cost
+        self.name = "+".join(m.name for m in self.moves)
+
+    def __repr__(self):
+        return self.name
+
+
+def enumerate_macros(moves, max_length=4, max_branching=3):
+    """Chains of 2 to max_length moves in which every move but the last has at
+    most max_branching successors (e.g. Sit -> SitRelax -> Stand): the search
+    would have few real choices along them anyway."""
+    def successors(m):
+        return [c for c in m.compatibles if c != m]
+
+    chains = []
+    frontier = [(m,) for m in moves if len(successors(m)) <= max_branching]
+    while frontier:
+        chain = frontier.pop()
+        for c in successors(chain[-1]):
+            extended = chain + (c,)
+            chains.append(extended)
+            if len(extended) < max_length and len(successors(c)) <= max_branching:
+                frontier.append(extended)
+    return chains
+
+
+def mine_macros(plans, max_length=4, min_count=2, limit=20):
+    """The limit most frequent chains of 2 to max_length consecutive moves
+    that appear at least min_count times in plans (lists of moves)."""
+    counts = Counter()
+    for plan in plans:
+        for length in range(2, max_length + 1):
+            for i in range(len(plan) - length + 1):
+                counts[tuple(plan[i:i + length])] += 1
+    frequent = [(n, chain) for chain, n in counts.items() if n >= min_count]
+    frequent.sort(key=lambda item: (-item[0], [m.name for m in item[1]]))
+    return [chain for n, chain in frequent[:limit]]
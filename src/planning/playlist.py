@@ -0,0 +1,167 @@
+"""
+Playlist planning: a show made of several songs, each planned as its own
+DanceProblem.
+
+The songs are described in a JSON file:
+
+    {"songs": [
+        {"file": "passin_me_by.mp3"},
+        {"file": "song2.mp3", "duration": 90, "mandatory": ["Hello", "Sit", "SitRelax"]},
+        {"file": "song3.mp3", "start": "Stand", "goal": "Crouch"}
+    ]}
+
+Consecutive songs are linked at their boundary moves: the start move of a
+song must be a compatible successor of the goal move of the previous one.
+Boundaries the file leaves open are fixed before planning (every song but
+the last ends on the hub move, every song but the first starts with the best
+connected successor of the previous goal), so no song waits for another one
+to be planned: they are all solved at once in parallel processes and handed
+back in playlist order as soon as each one is ready, so the robot dances the
+first song while the others are still being planned.
+
+Plans are read from and written to the plan cache by fingerprint, so a song
+planned before, or twice in the playlist, is only solved once.
+"""
+
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import sys
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+from planning.portfolio import replay
+
+
+FIELDS = ("file", "duration", "mandatory", "start", "goal")
+POLL_SECONDS = 1.0      # How often the song processes are checked while waiting for a plan
+
+
+def _best_connected(moves):
+    return max(moves, key=lambda m: (len(m.compatibles), m.name))
+
+
+def load_playlist(path, moves, start, goal, mandatory, duration, hub):
+    """Read and validate the playlist at path. moves maps names to moves;
+    start, goal, mandatory and duration are the defaults of the show (start
+    and goal only apply to the first and last song), hub the default move
+    between songs. Returns one dict per song with the keys of FIELDS, moves
+    as Move objects. Every mistake in the file is reported with a ValueError."""
+    with open(path) as f:
+        try:
+            entries = json.load(f)["songs"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError("{}: not a playlist ({})".format(path, e))
+    if not entries:
+        raise ValueError("{}: no songs".format(path))
+
+    songs = []
+    for k, entry in enumerate(entries):
+        where = "{}: song {}".format(path, k + 1)
+        if not isinstance(entry, dict) or "file" not in entry or set(entry) - set(FIELDS):
+            raise ValueError("{}: expected the field file and optionally {}".format(
+                where, ", ".join(FIELDS[1:])))
+        names = [entry[key] for key in ("start", "goal") if key in entry] + list(entry.get("mandatory", []))
+        unknown = [name for name in names if name not in moves]
+        if unknown:
+            raise ValueError("{}: unknown moves {}".format(where, ", ".join(unknown)))
+        song_duration = entry.get("duration", duration)
+        if not isinstance(song_duration, (int, float)) or song_duration <= 0:
+            raise ValueError("{}: duration must be a positive number of seconds".format(where))
+        songs.append({
+            "file": str(entry["file"]),
+            "duration": float(song_duration),
+            "mandatory": [moves[name] for name in entry["mandatory"]] if "mandatory" in entry
+                         else list(mandatory),
+            "start": moves[entry["start"]] if "start" in entry else None,
+            "goal": moves[entry["goal"]] if "goal" in entry else None,
+        })
+
+    for k, song in enumerate(songs):
+        if song["goal"] is None:
+            song["goal"] = goal if k == len(songs) - 1 else hub
+    for k, song in enumerate(songs):
+        if k == 0:
+            song["start"] = song["start"] or start
+            continue
+        previous = songs[k - 1]["goal"]
+        followers = [m for m in previous.compatibles if m != previous]
+        if song["start"] is None and followers:
+            song["start"] = _best_connected(followers)
+        if song["start"] not in followers:
+            raise ValueError("{}: song {} cannot start with {} after song {} ended on {}".format(
+                path, k + 1, song["start"], k, previous))
+    return songs
+
+
+def _solve_song(key, problem, solve, results):
+    # Progress lines of several songs at once would be unreadable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        node = solve(problem)
+    except Exception:
+        node = None     # Reported as a song without a plan rather than blocking the show
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    plan = [m.name for m in problem.plan_moves(node)] if node else None
+    results.put((key, plan, problem.nodes_explored))
+
+
+def plan_playlist(problems, solve, cache=None, prefix=""):
+    """Generator of (k, goal Node or None) for every problem, in order, each
+    as soon as it is solved. Problems missing from the cache (keyed by prefix
+    and fingerprint) are all solved at once, with solve, in their own process;
+    identical problems are solved once. New plans are stored in the cache. A
+    process that dies without a result (killed, out of memory) counts as a
+    song without a plan."""
+    keys = [prefix + problem.fingerprint() for problem in problems]
+    plans = {}
+    if cache is not None:
+        for key in keys:
+            entry = cache.get(key)
+            if entry:
+                plans[key] = entry["plan"]
+
+    results = multiprocessing.Queue()
+    workers = []
+    for k, key in enumerate(keys):
+        if key in plans or key in keys[:k]:
+            continue
+        # Not daemonic: the portfolio and segments solvers start processes of their own
+        worker = multiprocessing.Process(target=_solve_song, args=(key, problems[k], solve, results))
+        worker.start()
+        workers.append((key, worker))
+
+    try:
+        for k, (key, problem) in enumerate(zip(keys, problems)):
+            while key not in plans:
+                try:
+                    solved, plan, explored = results.get(timeout=POLL_SECONDS)
+                except Empty:
+                    # A process that exits normally has sent its result: only a failed exit loses it
+                    for worker_key, worker in workers:
+                        if worker_key not in plans and worker.exitcode not in (None, 0):
+                            plans[worker_key] = None
+                    continue
+                plans[solved] = plan
+                if plan is not None and cache is not None:
+                    node = _replay_names(problems[keys.index(solved)], plan)
+                    cache.put(solved, plan, node.path_cost, {"nodes_explored": explored})
+            yield k, _replay_names(problem, plans[key]) if plans[key] is not None else None
+    finally:
+        for _, worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+
+def _replay_names(problem, names):
+    """Goal Node of a plan given as move names, start move included."""
+    index = {m.name: i for i, m in enumerate(problem.all_moves_list)}
+    return replay(problem, [index[name] for name in names[1:]])
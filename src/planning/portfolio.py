@@ -0,0 +1,139 @@
+"""
+Portfolio planner: races several search algorithms on the same DanceProblem,
+each in its own process, and keeps the cheapest plan.
+
+Workers share the best cost found so far: they only report plans that
+improve on it, and the A* solvers prune every node whose lower bound is above
+it, so a plan found by one solver speeds up the others. The heuristic of
+DanceProblem is not admissible, so no solver finishing proves its plan
+optimal: the race goes on until every solver has finished or the deadline
+passes, and the cheapest plan reported so far wins. Annealed rollouts would
+run 2000 rollouts (several seconds) on the default show, so they are cut
+after ANNEALING_SECONDS: the race then lasts about as long as A*.
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import time
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+from aima.search import (Node, astar_search, weighted_astar_search, beam_search,
+                         annealed_rollouts, exp_schedule)
+
+
+ANNEALING_SECONDS = 1.0     # The race waits for every solver: rollouts must not set its pace
+
+
+def _astar(problem, report, bound, max_explored):
+    incumbent = problem.greedy_plan()
+    if incumbent is not None:
+        report(incumbent)
+    return astar_search(problem, bound=bound, incumbent=incumbent, max_explored=max_explored)
+
+
+def _weighted_astar(problem, report, bound, max_explored):
+    return weighted_astar_search(problem, weight=2.0, bound=bound, max_explored=max_explored)
+
+
+def _beam(problem, report, bound, max_explored):
+    # Wider beams keep more cheap nodes that cannot reach the goal in time and
+    # find no plan at all on the default show
+    return beam_search(problem, lambda n: n.path_cost + problem.h(n), width=10)
+
+
+def _annealing(problem, report, bound, max_explored):
+    # Rollouts never prove anything: cool down to T = 0 after ANNEALING_SECONDS at the latest
+    schedule = exp_schedule(limit=2000)
+    end = time.time() + ANNEALING_SECONDS
+    return annealed_rollouts(problem, lambda t: schedule(t) if time.time() < end else 0,
+                             on_improvement=report)
+
+
+# name -> solve(problem, report, bound, max_explored); bound() is the best cost found by any solver
+SOLVERS = {
+    "astar": _astar,
+    "weighted_astar": _weighted_astar,
+    "beam": _beam,
+    "annealing": _annealing,
+}
+
+DEFAULT_SOLVERS = ["astar", "weighted_astar", "beam", "annealing"]
+
+
+def _worker(name, problem, results, best_cost, max_explored):
+    solve = SOLVERS[name]
+
+    def report(node):
+        with best_cost.get_lock():
+            if node.path_cost >= best_cost.value:
+                return
+            best_cost.value = node.path_cost
+        results.put(("plan", name, node.path_cost,
+                     [problem.move_to_index[m] for m in problem.plan_moves(node)[1:]]))
+
+    try:
+        node = solve(problem, report, lambda: best_cost.value, max_explored)
+        if node is not None:
+            report(node)
+    finally:
+        results.put(("done", name, None, None))
+
+
+def replay(problem, actions):
+    """Rebuild the goal Node of a plan given as a list of move indices."""
+    node = Node(problem.initial)
+    for i in actions:
+        node = node.child_node(problem, problem.all_moves_list[i])
+    return node
+
+
+def portfolio_solve(problem, solvers=None, deadline=60.0, display=False, max_explored=None):
+    """Run the solvers in parallel processes for at most deadline seconds.
+    max_explored caps the explored set of the A* solvers.
+    Returns (goal node, name of the solver that found it), or (None, None)
+    if no solver found a plan in time."""
+    solvers = solvers or DEFAULT_SOLVERS
+    results = multiprocessing.Queue()
+    best_cost = multiprocessing.Value('d', float('inf'))
+
+    workers = []
+    for name in solvers:
+        worker = multiprocessing.Process(target=_worker,
+                                         args=(name, problem, results, best_cost, max_explored))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    start_t = time.time()
+    best, winner = None, None
+    running = len(workers)
+    try:
+        while running:
+            remaining = deadline - (time.time() - start_t)
+            if remaining <= 0:
+                break
+            try:
+                kind, name, value, actions = results.get(timeout=remaining)
+            except Empty:
+                break
+            if kind == "plan":
+                if best is None or value < best[0]:
+                    best, winner = (value, actions), name
+                if display:
+                    print("   [Portfolio] {} found a plan of cost {:.1f} after {:.2f}s".format(
+                        name, value, time.time() - start_t))
+            else:
+                running -= 1
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    if best is None:
+        return None, None
+    return replay(problem, best[1]), winner
@@ -0,0 +1,138 @@
+"""
+Progress and ETA estimates for best-first searches.
+
+ProgressEstimator is passed to best_first_graph_search / astar_search as
+`progress` and sees every expanded node, the frontier minimum. It combines:
+
+- the gap between the f of the frontier minimum and the bound (the
+  incumbent cost): with a consistent heuristic the f of the expanded nodes
+  never decreases, so the share of that gap already closed is how far the
+  search has got,
+- the expansions per f-layer (the gap split into LAYERS equal layers) and
+  how fast they grow from one layer to the next, extrapolated over the
+  layers left,
+- the total expansions of earlier runs of the same problem, kept in a local
+  JSON stats file.
+
+The first two only hold while f is monotone. As soon as an expanded node has
+a lower f than an earlier one (an inadmissible heuristic, like the one of
+DanceProblem, where one deep dive reaches a far lower f at once), they are
+dropped for the rest of the search and only the history is used: no share
+of the way is shown, and no ETA before the problem has been solved once.
+"""
+
+
+from __future__ import print_function
+
+import json
+import os
+import time
+
+
+LAYERS = 20
+
+
+class ProgressEstimator(object):
+    """Estimates remaining expansions and time of a search. report(estimator)
+    is called every `every` expansions; by default a one-line summary is
+    printed. Call finish() when the search is over to record the run."""
+
+    def __init__(self, bound=None, stats_file=None, key=None, every=1000, report=None):
+        self.bound = bound
+        self.stats_file = stats_file
+        self.key = key
+        self.every = every
+        self.report = report or print_progress
+        self.history = self.load_history()
+        self.start = time.time()
+        self.expanded = 0
+        self.f0 = None
+        self.f_max = None
+        self.monotone = True
+        self.layer_counts = [0] * LAYERS
+
+    def load_history(self):
+        if not self.stats_file or not os.path.exists(self.stats_file):
+            return []
+        try:
+            with open(self.stats_file) as f:
+                return json.load(f).get(self.key, [])
+        except (IOError, ValueError):
+            return []
+
+    def update(self, node, expanded, frontier_size):
+        """Called by the search for every expanded node (the frontier minimum)."""
+        self.expanded = expanded
+        if self.f0 is None:
+            self.f0 = self.f_max = node.f
+        if node.f < self.f_max - 1e-9 * max(1.0, abs(self.f_max)):
+            self.monotone = False
+        self.f_max = max(self.f_max, node.f)
+        fraction = self.fraction()
+        if fraction is not None:
+            self.layer_counts[min(LAYERS - 1, int(fraction * LAYERS))] += 1
+        if expanded % self.every == 0:
+            self.report(self)
+
+    def fraction(self):
+        """Share of the gap between the root's f and the bound closed by the
+        frontier minimum, in [0, 1], or None without a bound or once f has
+        been seen to decrease."""
+        if not self.monotone or self.bound is None or self.bound <= self.f0:
+            return None
+        return min(1.0, max(0.0, (self.f_max - self.f0) / (self.bound - self.f0)))
+
+    def remaining_expansions(self):
+        """Estimated expansions left, or None if there is nothing to base it on."""
+        estimates = []
+        fraction = self.fraction()
+        if fraction is not None:
+            layer = min(LAYERS - 1, int(fraction * LAYERS))
+            current = self.layer_counts[layer]
+            done = [c for c in self.layer_counts[:layer] if c]    # Layers already left behind
+            growth = float(done[-1]) / done[-2] if len(done) > 1 else 1.0
+            growth = min(2.0, max(0.5, growth))
+            per_layer = max(current, done[-1] * growth) if done else current
+            estimates.append(per_layer - current +
+                             sum(per_layer * growth ** i for i in range(1, LAYERS - layer)))
+        if self.history:
+            mean = sum(self.history) / float(len(self.history))
+            if mean > self.expanded:
+                estimates.append(mean - self.expanded)
+        if not estimates:
+            return None
+        return sum(estimates) / len(estimates)
+
+    def eta(self):
+        """Estimated seconds left, or None."""
+        remaining = self.remaining_expansions()
+        elapsed = time.time() - self.start
+        if remaining is None or not self.expanded or not elapsed:
+            return None
+        return remaining / (self.expanded / elapsed)
+
+    def finish(self):
+        """Record the number of expansions of this run in the stats file."""
+        if not self.stats_file or self.key is None:
+            return
+        try:
+            with open(self.stats_file) as f:
+                stats = json.load(f)
+        except (IOError, ValueError):
+            stats = {}
+        runs = stats.setdefault(self.key, [])
+        runs.append(self.expanded)
+        del runs[:-10]
+        with open(self.stats_file, "w") as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+
+
+def print_progress(estimator):
+    parts = ["{} plans analyzed".format(estimator.expanded)]
+    fraction = estimator.fraction()
+    if fraction is not None:
+        parts.append("f {:.0%} of the way to the bound".format(fraction))
+    eta = estimator.eta()
+    if eta is not None:
+        parts.append("ETA {:.0f}s".format(eta))
+    print("   [Thinking] " + ", ".join(parts))
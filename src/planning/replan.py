@@ -0,0 +1,129 @@
+"""
+Replanning during the show.
+
+ShowRunner hands out the moves of a plan one at a time and is told after
+each one whether the robot managed it. It keeps the actual state of the show:
+the last move that really completed, the mandatory moves really performed,
+their boredom history and the time really elapsed. When a move fails (the
+robot is taken to be where the previous move left it, and a failed mandatory
+move is still pending) or when the show runs so late that the rest of the
+plan would end after the song, the rest of the show is planned again from
+that state.
+
+The replan searches the same DanceProblem started from the actual state
+(DanceProblem.resumed), so the compatibility graph, shortest-time and
+finish-time tables of the first search are reused as they are. After a
+failure, the failed move is not offered as the first move of the replan, so
+the robot does not retry it straight away (over and over, if it keeps
+failing). The rest of
+the old plan, when it can still be danced from the actual state, bounds the
+search as an incumbent (a greedy plan does otherwise). The search is stopped
+after `budget` seconds, by default the duration of the next planned move,
+and the incumbent is kept.
+"""
+
+from __future__ import print_function
+
+import math
+import time
+
+from aima.search import Node, astar_search
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class _Deadline(object):
+    """Progress hook of astar_search that stops the search after seconds."""
+
+    def __init__(self, seconds):
+        self.end = time.time() + seconds
+
+    def update(self, node, expanded, frontier_size):
+        if expanded % 64 == 0 and time.time() > self.end:
+            raise SearchTimeout()
+
+
+def follow(problem, moves):
+    """The goal Node reached by dancing moves from problem.initial, or None if
+    one of them cannot follow the previous one in time or the moves do not end
+    the show."""
+    node = Node(problem.initial)
+    for move in moves:
+        if not any(action is move for action in problem.actions(node.state)):
+            return None
+        node = node.child_node(problem, move)
+    return node if problem.goal_test(node.state) else None
+
+
+class ShowRunner(object):
+    """Iterates over the moves of a plan (start move included) and replans the
+    rest of the show when report() is told of a failed or late move. clock
+    gives the show time in seconds."""
+
+    def __init__(self, problem, moves, budget=None, clock=time.time, display=True):
+        self.problem = problem
+        self.upcoming = list(moves)
+        self.budget = budget
+        self.clock = clock
+        self.display = display
+        self.started = None
+        self.state = None       # After the last completed move
+        self.replans = 0
+
+    def __iter__(self):
+        while self.upcoming:
+            if self.started is None:
+                self.started = self.clock()
+            yield self.upcoming.pop(0)
+
+    def report(self, move, ok):
+        """Record the outcome of move, just performed, and replan if needed."""
+        problem = self.problem
+        ticks = int(math.ceil((self.clock() - self.started) / problem.time_step - 1e-9))
+        state = self.state
+        if state is None:
+            # The show starts from the start move whether it worked or not
+            initial = problem.initial
+            self.state = problem.make_state(initial.move, initial.pending, ticks, 0, initial.last_used)
+        elif ok:
+            i = problem.move_to_index[move]
+            step = state.step + 1
+            last_used = list(state.last_used)
+            last_used[i] = step - step % problem.boredom_bucket
+            self.state = problem.make_state(i, state.pending & ~problem.index_bit[i], ticks, step,
+                                            tuple(last_used))
+        else:
+            self.state = problem.make_state(state.move, state.pending, ticks, state.step,
+                                            state.last_used)
+
+        end = ticks + sum(problem.to_ticks(m) for m in self.upcoming)
+        if not ok:
+            self.replan("{} failed".format(move.name), avoid=move)
+        elif end > problem.max_ticks:
+            self.replan("{:.1f}s late".format((end - problem.max_ticks) * problem.time_step))
+
+    def replan(self, reason, avoid=None):
+        """Replace the upcoming moves with a plan from the actual state that
+        does not start with the move avoid."""
+        start_t = time.time()
+        problem = self.problem.resumed(self.state, avoid)
+        budget = self.budget
+        if budget is None:
+            budget = self.upcoming[0].execution_time if self.upcoming else problem.goal_move.execution_time
+        incumbent = follow(problem, self.upcoming) or problem.greedy_plan()
+        try:
+            node = astar_search(problem, incumbent=incumbent, progress=_Deadline(budget))
+        except SearchTimeout:
+            node = incumbent
+        self.replans += 1
+        self.upcoming = problem.plan_moves(node)[1:] if node else []
+        if self.display:
+            if node:
+                print("[Replan] {} at {:.1f}s: rest of the show planned again in {:.2f}s: {}".format(
+                    reason, problem.seconds(self.state), time.time() - start_t,
+                    ", ".join(m.name for m in self.upcoming)))
+            else:
+                print("[Replan] {} at {:.1f}s: no plan fits in the time left, stopping the show".format(
+                    reason, problem.seconds(self.state)))
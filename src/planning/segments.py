@@ -0,0 +1,125 @@
+"""
+Hierarchical planning for long songs: the timeline is split into segments,
+each with its own subset of the mandatory moves and its own time budget, and
+every segment is solved as a separate DanceProblem in a worker process.
+
+Segments are stitched at a hub move (by default the move with the most
+compatible successors, StandZero with the default catalog, where Stand has
+as many and loses the tie on its name): every segment but the last
+ends on the hub and every segment but the first starts from it. Boredom
+scores restart at every segment, so the stitched plan is not optimal for the
+whole song, but planning time grows with the number of segments instead of
+exponentially with song length.
+"""
+
+from __future__ import print_function
+
+import math
+import multiprocessing
+import time
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+from planning.dp import dp_search
+from planning.portfolio import replay
+
+
+def find_hub(problem):
+    """The move with the most compatible successors."""
+    return max(problem.all_moves_list, key=lambda m: (len(m.compatibles), m.name))
+
+
+def spread_mandatory(mandatory_moves, durations):
+    """Spread the mandatory moves over segments of the given durations, longest
+    move first, always into the segment with the most time left. Returns one
+    list of mandatory moves per segment."""
+    budgets = list(durations)
+    mandatory = [[] for _ in durations]
+    for m in sorted(mandatory_moves, key=lambda m: (-m.execution_time, m.name)):
+        k = max(range(len(budgets)), key=lambda k: (budgets[k], -k))
+        mandatory[k].append(m)
+        budgets[k] -= m.execution_time
+    return mandatory
+
+
+def split_segments(problem, segment_length):
+    """Split the show into equal segments of at most segment_length seconds and
+    spread the mandatory moves over them. Returns a list of (duration, mandatory)."""
+    count = max(1, int(math.ceil(problem.MAX_DURATION / segment_length - 1e-9)))
+    durations = [problem.MAX_DURATION / count] * count
+    return list(zip(durations, spread_mandatory(problem.mandatory_moves, durations)))
+
+
+def _solve_segment(k, problem, solve, results):
+    node = solve(problem)
+    plan = [problem.move_to_index[m] for m in problem.plan_moves(node)] if node else None
+    results.put((k, plan))
+
+
+def segmented_search(problem, segment_length=30.0, segments=None, hub=None,
+                     solve=dp_search, deadline=None):
+    """Solve problem segment by segment, in parallel processes, and return the
+    goal Node of the stitched plan (replayed through problem, so its cost is
+    the cost of the whole show) or None if a segment has no plan in time.
+    segments is a list of (duration, mandatory moves); by default the show is
+    cut with split_segments(problem, segment_length). Mandatory moves that do
+    not fit in their segment are moved on to the next one. Segments are solved
+    with dp_search by default: short segments keep its tables small, and it
+    uses the whole time budget of a segment rather than stopping at the first
+    plan that reaches the hub. deadline, in seconds, bounds the wait for all
+    the segments together."""
+    segments = [(duration, list(mandatory)) for duration, mandatory in
+                segments or split_segments(problem, segment_length)]
+    hub = hub or find_hub(problem)
+
+    # Every segment after the first starts by (re)counting the hub that ended the previous one
+    subproblems = []
+    elapsed = 0.0
+    for k, (duration, mandatory) in enumerate(segments):
+        start = problem.start_move if k == 0 else hub
+        goal = problem.goal_move if k == len(segments) - 1 else hub
+        budget = duration if k == 0 else duration + hub.execution_time
+        offset = elapsed + duration - budget    # When the start move starts, if segments fill their budget
+        subproblem = problem.subproblem(start, goal, mandatory, budget, offset=offset)
+        # Push the longest mandatory moves to the next segment until this one fits
+        while not subproblem.is_feasible() and mandatory and k < len(segments) - 1:
+            segments[k + 1][1].append(mandatory.pop(0))
+            subproblem = problem.subproblem(start, goal, mandatory, budget, offset=offset)
+        subproblems.append(subproblem)
+        elapsed += duration
+
+    results = multiprocessing.Queue()
+    workers = []
+    for k, subproblem in enumerate(subproblems):
+        worker = multiprocessing.Process(target=_solve_segment, args=(k, subproblem, solve, results))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    start_t = time.time()
+    plans = {}
+    try:
+        while len(plans) < len(workers):
+            remaining = None if deadline is None else deadline - (time.time() - start_t)
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                k, plan = results.get(timeout=remaining)
+            except Empty:
+                return None
+            if plan is None:
+                return None
+            plans[k] = plan
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    moves = []
+    for k, subproblem in enumerate(subproblems):
+        segment_moves = [subproblem.all_moves_list[i] for i in plans[k]]
+        moves.extend(segment_moves if k == 0 else segment_moves[1:])
+    return replay(problem, [problem.move_to_index[m] for m in moves[1:]])
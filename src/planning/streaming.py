@@ -0,0 +1,90 @@
+"""
+Receding-horizon planning: instead of solving the whole show before the robot
+moves, plan only the next `horizon` seconds, hand them over for execution and
+plan the following window in a background thread while they are danced.
+
+Windows are stitched at the hub move like the segments of planning.segments.
+Each window is planned from the predicted end state of the previous one: the
+time it really used and the mandatory moves it performed are taken off, and
+the mandatory moves still pending are spread again over the rest of the show.
+A window that cannot fit its share of mandatory moves is first made longer
+(e.g. Sit -> SitRelax alone takes more than 20 s), then gives some of them
+up to the next windows.
+"""
+
+import math
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from planning.dp import dp_search
+from planning.segments import find_hub, spread_mandatory
+
+
+def stream_plan(problem, horizon=20.0, hub=None, solve=dp_search):
+    """Generator of the plan, one window of moves at a time (the first window
+    starts with the start move). Window k+1 is planned in the background
+    while the caller consumes window k. Stops early if a window has no plan."""
+    hub = hub or find_hub(problem)
+
+    def plan_window(first, remaining, pending, out):
+        try:
+            out.put(solve_window(first, remaining, pending))
+        except Exception:
+            out.put((None, True))   # Stops the show rather than leaving the consumer waiting
+
+    def solve_window(first, remaining, pending):
+        start = problem.start_move if first else hub
+        extra = 0.0 if first else hub.execution_time
+        offset = problem.MAX_DURATION - remaining - extra     # When the start move starts
+        windows_left = max(1, int(math.ceil(remaining / horizon - 1e-9)))
+        mandatory = spread_mandatory(pending, [remaining / windows_left] * windows_left)[0]
+        length = horizon
+
+        while True:
+            # The window that reaches the end of the show must end on the goal move
+            last = remaining - length < horizon / 2
+            if last:
+                length, mandatory = remaining, pending
+            goal = problem.goal_move if last else hub
+            window = problem.subproblem(start, goal, mandatory, length + extra, offset=offset)
+            if window.is_feasible() or last:
+                break
+            if length < remaining:
+                length = min(remaining, length + horizon)
+            elif mandatory:
+                mandatory = mandatory[1:]
+            else:
+                break
+
+        node = solve(window)
+        return (window.plan_moves(node), last) if node else (None, True)
+
+    remaining = problem.MAX_DURATION
+    pending = list(problem.mandatory_moves)
+    ready = Queue()
+    planner = threading.Thread(target=plan_window, args=(True, remaining, pending, ready))
+    planner.daemon = True
+    planner.start()
+
+    first = True
+    while True:
+        moves, last = ready.get()
+        if moves is None:
+            return
+        if not first:
+            moves = moves[1:]
+        remaining -= sum(m.execution_time for m in moves)
+        pending = [m for m in pending if m not in moves]
+        if not last:
+            # Plan the next window from the predicted end state while this one is danced
+            planner = threading.Thread(target=plan_window, args=(False, remaining, pending, ready))
+            planner.daemon = True
+            planner.start()
+        yield moves
+        if last:
+            return
+        first = False
@@ -0,0 +1,98 @@
+"""
+Symmetries of the move catalog: permutations of the moves that map the
+compatibility graph onto itself and only swap moves with the same key (e.g.
+duration and boredom rate), such as DiagonalLeft <-> DiagonalRight together
+with RotationLeftFoot <-> RotationRightFoot. Two search states that are
+mirror images of each other have mirrored successors with the same costs, so
+a search only needs to explore one of them.
+"""
+
+from itertools import combinations
+
+
+def find_mirrors(moves, key, fixed=()):
+    """Involutions of moves that preserve key(move) and the compatibility
+    graph and leave the fixed moves in place, found by trying every pair of
+    moves with the same key. Each one is a dict {move: mirror} of the moves
+    it does not fix."""
+    moves = sorted(moves, key=lambda m: m.name)
+    fixed = set(fixed)
+    predecessors = {m: set() for m in moves}
+    for m in moves:
+        for c in m.compatibles:
+            if c in predecessors:
+                predecessors[c].add(m)
+
+    mirrors = []
+    for a, b in combinations(moves, 2):
+        if a in fixed or b in fixed or key(a) != key(b):
+            continue
+        if any(mirror.get(a, a) == b for mirror in mirrors):
+            continue
+        mirror = _extend(a, b, moves, predecessors, key, fixed)
+        if mirror is not None:
+            mirrors.append(mirror)
+    return mirrors
+
+
+def _extend(a, b, moves, predecessors, key, fixed):
+    """Grow the swap a <-> b into a graph automorphism, pairing up neighbours
+    that only one of two mirrored moves has. None if there is none."""
+    sigma = {a: b, b: a}
+    queue = [a, b]
+    while queue:
+        x = queue.pop()
+        y = sigma[x]
+        for near_x, near_y in ((x.compatibles, y.compatibles), (predecessors[x], predecessors[y])):
+            for u in sorted(near_x, key=lambda m: m.name):
+                if u in sigma:
+                    continue
+                if u in near_y:
+                    sigma[u] = u
+                    queue.append(u)
+                    continue
+                partners = [v for v in sorted(near_y - near_x, key=lambda m: m.name)
+                            if v not in sigma and v not in fixed and u not in fixed and key(v) == key(u)]
+                if not partners:
+                    return None
+                v = partners[0]
+                sigma[u], sigma[v] = v, u
+                queue.extend((u, v))
+
+    for m in moves:
+        sigma.setdefault(m, m)
+    for m in moves:
+        if set(sigma[c] for c in m.compatibles if c in sigma) != \
+                set(c for c in sigma[m].compatibles if c in sigma):
+            return None
+    return {m: s for m, s in sigma.items() if m != s}
+
+
+def mirror_group(generators, size, limit=64):
+    """All the permutations of range(size) generated by generators (tuples
+    p with p[i] the image of i), identity first. Generators that would make
+    the group larger than limit are left out."""
+    identity = tuple(range(size))
+    group = [identity]
+    for generator in generators:
+        closure = _close(group + [generator])
+        if len(closure) <= limit:
+            group = closure
+    return group
+
+
+def _close(permutations):
+    group = [permutations[0]]
+    seen = set(group)
+    queue = list(permutations[1:])
+    while queue:
+        p = queue.pop()
+        if p in seen:
+            continue
+        seen.add(p)
+        group.append(p)
+        for q in list(group):
+            for r in (tuple(p[i] for i in q), tuple(q[i] for i in p)):
+                if r not in seen:
+                    queue.append(r)
+    return group
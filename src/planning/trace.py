@@ -0,0 +1,67 @@
+"""
+Binary search traces for offline analysis.
+
+TraceWriter is passed to best_first_graph_search / astar_search as `trace` and
+appends one fixed-width record per expansion to a file, through a buffered
+stream. load_trace maps the file back as a NumPy structured array without
+reading it into memory, e.g.
+
+    trace = load_trace("search.trace")
+    slow = trace[trace["frontier"] > 10000]
+"""
+
+import struct
+import time
+
+import numpy as np
+
+
+# One record per expansion; RECORD and TRACE_DTYPE describe the same packed layout
+TRACE_DTYPE = np.dtype([
+    ("node", "<i8"),        # id of the expanded node, in expansion order
+    ("parent", "<i8"),      # id of its parent (-1 for the root)
+    ("move", "<i4"),        # move id of the node's state (-1 if unknown)
+    ("g", "<f8"),
+    ("h", "<f8"),
+    ("f", "<f8"),
+    ("frontier", "<i4"),    # frontier size at expansion time
+    ("time", "<f8"),        # seconds since the trace was opened
+])
+RECORD = struct.Struct("<qqidddid")
+
+
+class TraceWriter(object):
+    """Streams expansion records to path. move_id(node) gives the move id to
+    store for a node; by default -1 is stored."""
+
+    def __init__(self, path, move_id=None, buffer_size=1 << 16):
+        self.file = open(path, "wb", buffer_size)
+        self.move_id = move_id
+        self.next_id = 0
+        self.start = time.time()
+
+    def record(self, node, frontier_size):
+        """Append the record of an expanded node."""
+        node.trace_id = self.next_id
+        self.next_id += 1
+        parent = getattr(node.parent, "trace_id", -1)
+        move = self.move_id(node) if self.move_id else -1
+        self.file.write(RECORD.pack(
+            node.trace_id, parent, move, node.path_cost,
+            getattr(node, "h", float("nan")), getattr(node, "f", float("nan")),
+            frontier_size, time.time() - self.start
+        ))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_trace(path):
+    """Memory-map a trace file as a read-only structured array of TRACE_DTYPE."""
+    return np.memmap(path, dtype=TRACE_DTYPE, mode="r")
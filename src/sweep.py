@@ -0,0 +1,167 @@
+"""
+Parameter sweep over the cost-function constants: AESTHETIC_WEIGHT,
+CLUMPING_PENALTY, PENDING_PENALTY (the heuristic seconds per pending
+mandatory move) and the ADD_HIGH / ADD_MID / ADD_LOW boredom rates.
+
+Every point of a grid (or of a random sample of it) plans the default show
+in a pool of worker processes, with a timeout per point. For each point the
+plan quality (share of the song spent on HIGH/MID/LOW moves, share of the
+song used, repeated moves) and the search cost (expansions, seconds) are
+appended to a JSONL file, and the points that no other point beats on every
+one of high_share, utilisation, repetition and seconds are printed.
+
+    python sweep.py sweep.jsonl --grid AESTHETIC_WEIGHT=5,10,20 --grid ADD_HIGH=1,1.5,2
+    python sweep.py sweep.jsonl --grid CLUMPING_PENALTY=0,100 --random 20
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import random
+import time
+
+import batch
+import dance
+
+
+PARAMETERS = {
+    "AESTHETIC_WEIGHT": dance.DanceProblem.AESTHETIC_WEIGHT,
+    "CLUMPING_PENALTY": dance.DanceProblem.CLUMPING_PENALTY,
+    "PENDING_PENALTY": dance.DanceProblem.PENDING_PENALTY,
+    "ADD_HIGH": dance.ADD_HIGH,
+    "ADD_MID": dance.ADD_MID,
+    "ADD_LOW": dance.ADD_LOW,
+}
+
+# (metric, +1 to maximize / -1 to minimize) for the Pareto front
+OBJECTIVES = [("high_share", 1), ("utilisation", 1), ("repetition", -1), ("seconds", -1)]
+
+
+def grid_points(grid):
+    """Every combination of the values in grid {name: [values]}."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[n] for n in names])]
+
+
+def random_points(grid, count, seed=0):
+    """count points drawn uniformly between the smallest and largest value of
+    every parameter in grid."""
+    rng = random.Random(seed)
+    return [{name: round(rng.uniform(min(values), max(values)), 3) for name, values in grid.items()}
+            for _ in range(count)]
+
+
+def make_problem(point):
+    """The default show of dance.py, with the constants of point."""
+    constants = dict(PARAMETERS, **point)
+    rates = {"HIGH": constants["ADD_HIGH"], "MID": constants["ADD_MID"], "LOW": constants["ADD_LOW"]}
+    problem_class = type("SweepProblem", (dance.DanceProblem,), {
+        name: float(constants[name]) for name in ("AESTHETIC_WEIGHT", "CLUMPING_PENALTY", "PENDING_PENALTY")
+    })
+    return problem_class(
+        start_move=dance.MOVES[batch.DEFAULTS["start"]],
+        goal_move=dance.MOVES[batch.DEFAULTS["goal"]],
+        mandatory_moves=[dance.MOVES[name] for name in batch.DEFAULTS["mandatory"]],
+        all_moves_list=dance.ALL_MOVES,
+        partitions={m: rates[dance.CATEGORY[m]] for m in dance.ALL_MOVES}
+    )
+
+
+def plan_metrics(problem, moves):
+    """Quality of a plan: share of the song spent on every category, share of
+    the song used, and share of the moves that repeat an earlier one."""
+    song = problem.MAX_DURATION
+    metrics = {}
+    for category in ("HIGH", "MID", "LOW"):
+        metrics[category.lower() + "_share"] = sum(
+            m.execution_time for m in moves if dance.CATEGORY[m] == category) / song
+    metrics["utilisation"] = sum(m.execution_time for m in moves) / song
+    metrics["repetition"] = 1.0 - float(len(set(moves))) / len(moves)
+    return metrics
+
+
+def evaluate(job):
+    """Plan the show for one point in a worker; returns its result line."""
+    point, timeout = job
+    result = {"point": point}
+    start_t = time.time()
+    try:
+        problem = make_problem(point)
+        solution = batch.run_quietly(lambda: dance.seeded_astar_search(problem), timeout)
+        result["expansions"] = problem.nodes_explored
+        if solution:
+            result.update(plan_metrics(problem, problem.plan_moves(solution)), status="ok")
+        else:
+            result["status"] = "no_plan"
+    except batch.JobTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result.update(status="error", error="{}: {}".format(type(e).__name__, e))
+    result["seconds"] = time.time() - start_t
+    return result
+
+
+def pareto_front(results):
+    """The results that no other result is at least as good as on every
+    objective and better on one."""
+    def dominates(a, b):
+        better_or_equal = all(sign * a[k] >= sign * b[k] for k, sign in OBJECTIVES)
+        return better_or_equal and any(sign * a[k] > sign * b[k] for k, sign in OBJECTIVES)
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def parse_grid(options):
+    grid = {name: [value] for name, value in PARAMETERS.items()}
+    for option in options:
+        name, _, values = option.partition("=")
+        if name not in PARAMETERS or not values:
+            raise SystemExit("--grid expects NAME=v1,v2,... with NAME in {}".format(", ".join(sorted(PARAMETERS))))
+        grid[name] = [float(v) for v in values.split(",")]
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the cost-function constants of dance.py")
+    parser.add_argument("results", help="JSONL file the results are appended to")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=v1,v2,...",
+                        help="values of a constant ({}); the others keep their default".format(
+                            ", ".join(sorted(PARAMETERS))))
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="evaluate N random points within the range of every --grid "
+                             "instead of the whole grid")
+    parser.add_argument("--seed", type=int, default=0, help="seed of --random (default: 0)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="seconds a single point may take (default: 60)")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    points = random_points(grid, args.random, args.seed) if args.random else grid_points(grid)
+    varied = sorted(name for name, values in grid.items() if len(set(values)) > 1)
+    print "[Sweep] {} points, {} workers".format(len(points), args.workers)
+
+    results = []
+    pool = multiprocessing.Pool(args.workers, batch.init_worker, (False,))
+    try:
+        with open(args.results, "a") as out:
+            for k, result in enumerate(pool.imap_unordered(evaluate, [(p, args.timeout) for p in points]), 1):
+                out.write(json.dumps(result, sort_keys=True) + "\n")
+                out.flush()
+                print "[Sweep] {}/{} {}: {} in {:.1f}s".format(
+                    k, len(points), ", ".join("{}={}".format(name, result["point"][name]) for name in varied),
+                    result["status"], result["seconds"])
+                if result["status"] == "ok":
+                    results.append(result)
+    finally:
+        pool.terminate()
+
+    print "\n[Sweep] Pareto front (high share, utilisation, repetition, seconds):"
+    print "  ".join("{:>16}".format(name) for name in varied + ["high", "util", "repeat", "seconds", "expanded"])
+    for r in sorted(pareto_front(results), key=lambda r: r["seconds"]):
+        print "  ".join(["{:>16}".format(r["point"][name]) for name in varied] + [
+            "{:>16.2f}".format(r["high_share"]), "{:>16.2f}".format(r["utilisation"]),
+            "{:>16.2f}".format(r["repetition"]), "{:>16.2f}".format(r["seconds"]),
+            "{:>16}".format(r["expansions"])
+        ])